@@ -0,0 +1,48 @@
+import httpx
+from google import genai
+from google.genai import types
+
+from core.config import settings
+
+class AISession:
+    """Owns the process-wide Gemini client so every request reuses its pooled connections."""
+
+    def __init__(self):
+        self._client: genai.Client | None = None
+
+    def _build_http_options(self) -> types.HttpOptions:
+        limits = httpx.Limits(
+            max_connections=settings.GENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GENAI_KEEPALIVE_EXPIRY,
+        )
+        return types.HttpOptions(
+            timeout=settings.GENAI_TIMEOUT_MS,
+            # Explicit transports carry the pool limits. google-genai otherwise prefers aiohttp whenever it is
+            # installed (chromadb pulls it in), and opens a new aiohttp session for every request.
+            client_args={"transport": httpx.HTTPTransport(limits=limits)},
+            async_client_args={"transport": httpx.AsyncHTTPTransport(limits=limits)},
+        )
+
+    def get_client(self) -> genai.Client:
+        if self._client is None:
+            self._client = genai.Client(
+                api_key=settings.GOOGLE_API_KEY,
+                http_options=self._build_http_options(),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        # google-genai (1.33.0) has no public close; its API client owns one sync and one async httpx client.
+        api_client = getattr(client, "_api_client", None)
+        async_httpx_client = getattr(api_client, "_async_httpx_client", None)
+        if async_httpx_client is not None:
+            await async_httpx_client.aclose()
+        httpx_client = getattr(api_client, "_httpx_client", None)
+        if httpx_client is not None:
+            httpx_client.close()
+
+ai_session = AISession()
@@ -3,9 +3,9 @@ from google import genai
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from core.ai_client import ai_session
 from core.vector_db import VectorSession, vector_session
-from core.config import settings
-from core.db import async_engine
+from core.db import async_engine, read_replicas
 
 async_session_maker = async_sessionmaker(bind=async_engine, expire_on_commit=False)
 
@@ -13,14 +13,19 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with read_replicas.session() as session:
+        yield session
+
 def get_ai_client() -> Generator[genai.Client, None, None]:
-    client = genai.Client(api_key=settings.GOOGLE_API_KEY)
-    yield client
+    yield ai_session.get_client()
 
 def get_vector_session() -> Generator[VectorSession, None, None]:
     yield vector_session
 
 
 SessionDep = Annotated[AsyncSession, Depends(get_db)]
+# Read-only catalog queries: a read replica if configured, otherwise the primary.
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_db)]
 AIClientDep = Annotated[genai.Client, Depends(get_ai_client)]
 VectorSessionDep = Annotated[VectorSession, Depends(get_vector_session)]
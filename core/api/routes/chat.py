@@ -1,34 +1,71 @@
-import asyncio
 import json
-from fastapi import APIRouter
+import time
+from typing import Callable, List, Literal, Optional
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from core.api.deps import AIClientDep, VectorSessionDep
+from core.cache import SemanticAnswerCache
+from core.concurrency import AdmissionLimiter, OverloadedError, SingleFlight
+from core.config import settings
+from core.events import CatalogChange, catalog_events
+from core.metrics import PROMPT_TOKENS, observe_stage, register_cache, register_stats
+from core.rag_context import estimate_tokens
+from core.retrieval import get_embedding, normalize_question, retrieve_from_vector_db, retrieve_hybrid_context
+from core.vector_db import build_facet_where
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-def get_embedding(client: AIClientDep, text):
-    response = client.models.embed_content(
-        model="models/text-embedding-004",
-        contents=text,
-    )
-    return response.embeddings[0].values
+answer_cache = SemanticAnswerCache(
+    max_size=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    max_distance=settings.ANSWER_CACHE_MAX_DISTANCE,
+)
+register_cache("answer", answer_cache)
 
-def retrieve_from_vector_db(vector_session: VectorSessionDep, ai_client: AIClientDep, input_text):
-    query_embedding = get_embedding(ai_client, input_text)
-    collection = vector_session.get_product_collection()
-    results = collection.query(query_embeddings=[query_embedding], n_results=5)
+def invalidate_answers(change: CatalogChange):
+    if change.full:
+        answer_cache.clear()
+    else:
+        answer_cache.invalidate_products(change.product_ids)
 
-    if not results["documents"] or not results["documents"][0]:
-        return "No relevant information found."
+catalog_events.subscribe(invalidate_answers)
 
-    return results["documents"][0]
+chat_flights: SingleFlight[str] = SingleFlight()
+chat_limiter = AdmissionLimiter(
+    limit=settings.CHAT_MAX_CONCURRENT,
+    max_waiting=settings.CHAT_MAX_QUEUED,
+    timeout=settings.CHAT_QUEUE_TIMEOUT,
+)
+register_stats("chat", lambda: {
+    "flights_started": chat_flights.started,
+    "flights_joined": chat_flights.joined,
+    "active": chat_limiter.active,
+    "waiting": chat_limiter.waiting,
+    "rejected": chat_limiter.rejected,
+})
 
-async def ask_gemini_generator(client: AIClientDep, context, input_text):
+def format_message(payload: dict) -> str:
+    return json.dumps(payload) + "\n"
+
+async def replay_answer_generator(messages: list[str]):
+    yield format_message({'status': 'start'})
+    for message in messages:
+        yield message
+    yield format_message({'status': 'complete'})
+
+async def ask_gemini_generator(
+    client: AIClientDep,
+    context,
+    input_text,
+    on_complete: Optional[Callable[[list[str]], None]] = None,
+    report: Optional[dict] = None,
+):
     prompt =  f"""You are an AI assistant answering product-related questions. 
 Use the following retrieved product information to generate a concise and helpful response.
 
-Below is the relevant product information retrieved from the database: "{context}"
+Below is the relevant product information retrieved from the database:
+{context}
 
 The user asked: "{input_text}"
     
@@ -48,30 +85,150 @@ For the format of the response:
 - Use bold for important information.
 """
 
-    yield json.dumps({'status': 'start'}) + "\n"
+    prompt_tokens = estimate_tokens(prompt)
+    PROMPT_TOKENS.labels("estimated").observe(prompt_tokens)
+    if report is not None:
+        report["prompt_tokens"] = prompt_tokens
+
+    yield format_message({'status': 'start'})
+    messages = []
     buffer = ""
-    for response in client.models.generate_content_stream(
+    usage_metadata = None
+    # The headers are already sent, so these two stages only reach /metrics, not Server-Timing.
+    started = time.perf_counter()
+    first_chunk_at = None
+    async for response in await client.aio.models.generate_content_stream(
         model="gemini-2.0-flash",
         contents=[prompt]
     ):
+        if first_chunk_at is None:
+            first_chunk_at = time.perf_counter()
+            observe_stage("llm_first_token", first_chunk_at - started)
+        usage_metadata = getattr(response, "usage_metadata", None) or usage_metadata
         buffer += response.candidates[0].content.parts[0].text
         if (len(buffer) > 3):
-            yield json.dumps({'m': buffer}) + "\n"
+            messages.append(format_message({'m': buffer}))
+            yield messages[-1]
             buffer = ""
-        await asyncio.sleep(0.05)
 
     if (buffer):
-        yield json.dumps({'m': buffer}) + "\n"
+        messages.append(format_message({'m': buffer}))
+        yield messages[-1]
 
-    yield json.dumps({'status': 'complete'}) + "\n"
+    if first_chunk_at is not None:
+        observe_stage("llm_stream", time.perf_counter() - first_chunk_at)
+    if usage_metadata is not None and usage_metadata.prompt_token_count:
+        PROMPT_TOKENS.labels("reported").observe(usage_metadata.prompt_token_count)
+
+    if on_complete:
+        on_complete(messages)
+    yield format_message({'status': 'complete'})
 
 class ChatRequest(BaseModel):
     question: str
+    retriever: Literal["vector", "hybrid"] = settings.CHAT_RETRIEVER
+    # Same facet filters as /products-with-filter, applied inside the vector query.
+    cid: List[str] = []
+    fid: List[str] = []
+    aid: List[str] = []
+    iid: List[str] = []
+    sid: List[str] = []
+    hid: List[str] = []
+
+    def facet_where(self) -> Optional[dict]:
+        return build_facet_where(self.model_dump(include={"cid", "fid", "aid", "iid", "sid", "hid"}))
+
+    def flight_key(self) -> tuple:
+        facets = tuple(tuple(sorted(getattr(self, key))) for key in ("cid", "fid", "aid", "iid", "sid", "hid"))
+        return normalize_question(self.question), self.retriever, facets
+
+async def limited(messages):
+    """Runs `messages` while holding a chat_limiter slot; OverloadedError fails the whole flight."""
+    await chat_limiter.acquire()
+    try:
+        async for message in messages:
+            yield message
+    finally:
+        chat_limiter.release()
+
+async def answer_generator(
+    ai_client: AIClientDep, vector_session: VectorSessionDep, chat_request: ChatRequest, report: dict
+):
+    query_embedding = await get_embedding(ai_client, chat_request.question)
+    where = chat_request.facet_where()
+    if chat_request.retriever == "hybrid":
+        context = await retrieve_hybrid_context(
+            vector_session, ai_client, chat_request.question, query_embedding, where=where
+        )
+    else:
+        context = await retrieve_from_vector_db(vector_session, query_embedding, where=where)
+
+    cached_messages = answer_cache.lookup(query_embedding, context.content_hashes)
+    if cached_messages is not None:
+        answer = replay_answer_generator(cached_messages)
+    else:
+        prompt_context = context.prompt_context()
+        report["context_products"] = prompt_context.products
+        report["context_dropped"] = prompt_context.dropped
+        # Only the generation takes a slot, so answers replayed from answer_cache are never queued or shed.
+        answer = limited(ask_gemini_generator(
+            ai_client,
+            prompt_context.text,
+            chat_request.question,
+            on_complete=lambda messages: answer_cache.store(
+                query_embedding, context.content_hashes, messages
+            ),
+            report=report,
+        ))
+    async for message in answer:
+        yield message
+
+async def prepend(first: str, rest):
+    yield first
+    async for message in rest:
+        yield message
 
 @router.post("")
 async def chat(ai_client: AIClientDep, vector_session: VectorSessionDep, chat_request: ChatRequest):
-    context = retrieve_from_vector_db(vector_session, ai_client, chat_request.question)
-    return StreamingResponse(
-            ask_gemini_generator(ai_client, context, chat_request.question),
-            media_type="text/plain"
-        )
\ No newline at end of file
+    if not vector_session.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Product index is still being built",
+            headers={"Retry-After": str(settings.CHAT_RETRY_AFTER_SECONDS)},
+        )
+
+    # Identical questions in flight share one retrieval and one generation.
+    key = chat_request.flight_key()
+    flight = chat_flights.join(key)
+    if flight is None:
+        report = {}
+        flight = chat_flights.start(
+            key, answer_generator(ai_client, vector_session, chat_request, report), info=report
+        )
+
+    # The first message is sent once retrieval and admission finished, so their errors still fail
+    # the request and its stages still reach Server-Timing of the request that started the flight.
+    messages = flight.subscribe()
+    try:
+        first = await anext(messages)
+    except OverloadedError:
+        await messages.aclose()
+        raise HTTPException(
+            status_code=503,
+            detail="Too many chat requests",
+            headers={"Retry-After": str(settings.CHAT_RETRY_AFTER_SECONDS)},
+        )
+    except BaseException:
+        await messages.aclose()
+        raise
+    # Absent when the answer is replayed from answer_cache.
+    headers = {
+        header: str(flight.info[key])
+        for header, key in (
+            ("X-Prompt-Tokens", "prompt_tokens"),
+            ("X-Context-Products", "context_products"),
+            ("X-Context-Dropped", "context_dropped"),
+        )
+        if key in flight.info
+    }
+    return StreamingResponse(prepend(first, messages), media_type="text/plain", headers=headers)
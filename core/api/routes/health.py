@@ -0,0 +1,45 @@
+from dataclasses import asdict
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from core import build_index
+from core.api.deps import SessionDep, VectorSessionDep
+from core.catalog_sync import catalog_sync
+from core.config import settings
+from core.facet_index import facet_index
+from core.search_index import search_index
+
+router = APIRouter(tags=["health"])
+
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz(session: SessionDep, vector_session: VectorSessionDep):
+    """
+    Ready as soon as Postgres answers: the catalog endpoints need nothing else, so a rolling deploy
+    never holds back catalog traffic for the embedding run. /chat readiness and build progress are
+    reported alongside and /chat itself answers 503 until `chat` is true.
+    """
+    try:
+        await session.execute(text("SELECT 1"))
+        database = True
+    except Exception as e:
+        print(f"Readiness check failed: {e}")
+        database = False
+
+    body = {
+        "ready": database,
+        "database": database,
+        "chat": vector_session.ready,
+        "vector_index": {
+            "version": vector_session.version,
+            "build": asdict(build_index.build_progress),
+            "sync": catalog_sync.stats(),
+        },
+        "search_index": search_index.ready,
+        "facet_index": facet_index.ready if settings.PRODUCT_FILTER_ENGINE == "index" else None,
+    }
+    return JSONResponse(body, status_code=200 if database else 503)
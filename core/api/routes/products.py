@@ -1,31 +1,26 @@
-from sqlalchemy.orm import joinedload
-from sqlmodel import select
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Response
 
-from core.api.deps import SessionDep
-from core.models.product import Product, ProductDetail
+from core.api.deps import ReadSessionDep
+from core.crud import etag_matches, load_product_json
+from core.models.product import ProductDetail
 
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 @router.get("/{product_id}", response_model=ProductDetail)
-async def get_product(product_id: str, session: SessionDep):
-    statement = (
-        select(Product)
-        .where(Product.product_id == product_id)
-        .options(
-            joinedload(Product.material_cat),
-            joinedload(Product.material_form),
-            joinedload(Product.applications),
-            joinedload(Product.ingredients),
-            joinedload(Product.suppliers),
-            joinedload(Product.healthclaims),
-            joinedload(Product.images)
-        )
-    )
-    result = await session.scalars(statement=statement)
-    product = result.unique().one_or_none()
-
-    if product is None:
+async def get_product(
+    product_id: str,
+    session: ReadSessionDep,
+    if_none_match: Optional[str] = Header(default=None),
+):
+    # Served from core.crud.product_detail_cache when possible; a matching ETag never reaches Postgres.
+    found = await load_product_json(session, [product_id])
+    if not found:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+
+    product_json = found[0]
+    headers = {"ETag": product_json.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, product_json.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=product_json.body, media_type="application/json", headers=headers)
@@ -1,11 +1,31 @@
+import base64
+import binascii
+import bisect
 from enum import Enum
-from typing import List, Optional
-from sqlalchemy.orm import joinedload
-from sqlmodel import or_, select
-from fastapi import APIRouter, Query
+from typing import Callable, List, Optional
+from sqlmodel import func, or_, select
+from fastapi import APIRouter, HTTPException, Query, Response
 
-from core.api.deps import SessionDep
-from core.models.product import Application, Healthclaim, Ingredients, Product, ProductDetail, Supplier
+from core.api.deps import ReadSessionDep
+from core.config import settings
+from core.crud import ProductJSON, id_in, load_product_json
+from core.facet_index import facet_index
+from core.metrics import timed
+from core.search_index import search_index
+from core.models.product import (
+    Application,
+    Healthclaim,
+    Ingredients,
+    MaterialCategory,
+    MaterialForm,
+    Product,
+    ProductApplication,
+    ProductDetail,
+    ProductHealthclaim,
+    ProductIngredients,
+    ProductSupplier,
+    Supplier,
+)
 from core.util import BaseSchema
 
 router = APIRouter(prefix="/products-with-filter", tags=["products-with-filter"])
@@ -22,38 +42,82 @@ class FilterKey(str, Enum):
 class FilterOption(BaseSchema):
     id: str
     name: str
+    count: Optional[int] = None
 
 class Filter(BaseSchema):
     key: FilterKey
     options: List[FilterOption]
 
+# (key, option model, option id, option name, link model, link option id, link product id)
+FACET_SOURCES = [
+    (FilterKey.cid, MaterialCategory, MaterialCategory.material_cat_id, MaterialCategory.material_cat_name,
+        Product, Product.material_cat_id, Product.product_id),
+    (FilterKey.fid, MaterialForm, MaterialForm.material_form_id, MaterialForm.material_form_name,
+        Product, Product.material_form_id, Product.product_id),
+    (FilterKey.aid, Application, Application.application_id, Application.application_name,
+        ProductApplication, ProductApplication.application_id, ProductApplication.product_id),
+    (FilterKey.hid, Healthclaim, Healthclaim.healthclaim_id, Healthclaim.healthclaim_name,
+        ProductHealthclaim, ProductHealthclaim.healthclaim_id, ProductHealthclaim.product_id),
+    (FilterKey.iid, Ingredients, Ingredients.ingredients_id, Ingredients.ingredients_name,
+        ProductIngredients, ProductIngredients.ingredients_id, ProductIngredients.product_id),
+    (FilterKey.sid, Supplier, Supplier.supplier_id, Supplier.supplier_name,
+        ProductSupplier, ProductSupplier.supplier_id, ProductSupplier.product_id),
+]
+
 class ProductFilterResponse(BaseSchema):
     products: list[ProductDetail]
     filter_options: list[Filter]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
 
-@router.get("", response_model=ProductFilterResponse)
-async def get_products(
-    session: SessionDep,
-    keyword: Optional[str] = Query(default=None, description="keyword"),
-    cid: List[str] = Query(default=[], description="material_cat_id"),
-    fid: List[str] = Query(default=[], description="material_form_id"),
-    aid: List[str] = Query(default=[], description="application_id"),
-    iid: List[str] = Query(default=[], description="ingredients_id"),
-    sid: List[str] = Query(default=[], description="supplier_id"),
-    hid: List[str] = Query(default=[], description="healthclaim_id"),
-):
-    statement = select(Product).options(
-        joinedload(Product.material_cat),
-        joinedload(Product.material_form),
-        joinedload(Product.applications),
-        joinedload(Product.ingredients),
-        joinedload(Product.suppliers),
-        joinedload(Product.healthclaims),
-        joinedload(Product.images)
-    )
+EMPTY_PRODUCTS_PREFIX = b'{"products":[]'
+
+def render_products_page(
+    products: list[ProductJSON],
+    filter_options: list[Filter],
+    next_cursor: Optional[str],
+    total: Optional[int],
+) -> Response:
+    """ProductFilterResponse JSON with the cached product bytes spliced in rather than re-serialized."""
+    with timed("serialize"):
+        rest = ProductFilterResponse.model_construct(
+            products=[], filter_options=filter_options, next_cursor=next_cursor, total=total
+        ).model_dump_json(by_alias=True).encode()
+        rows = b",".join(product.body for product in products)
+        body = b'{"products":[' + rows + b"]" + rest[len(EMPTY_PRODUCTS_PREFIX):]
+    return Response(content=body, media_type="application/json")
 
+def encode_cursor(product_id: str) -> str:
+    return base64.urlsafe_b64encode(product_id.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except (binascii.Error, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def encode_keyword_cursor(score: float, product_id: str) -> str:
+    return encode_cursor(f"{score!r}|{product_id}")
+
+def decode_keyword_cursor(cursor: str) -> tuple[float, str]:
+    score, _, product_id = decode_cursor(cursor).partition("|")
+    try:
+        return float(score), product_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_filter_conditions(
+    keyword: Optional[str],
+    cid: List[str],
+    fid: List[str],
+    aid: List[str],
+    iid: List[str],
+    sid: List[str],
+    hid: List[str],
+) -> list:
+    conditions = []
     if keyword:
-        statement = statement.where(
+        conditions.append(
             or_(
                 Product.product_name.ilike(f"%{keyword}%"),
                 Product.applications.any(Application.application_name.ilike(f"%{keyword}%")),
@@ -61,67 +125,180 @@ async def get_products(
         )
 
     if cid:
-        statement = statement.where(Product.material_cat_id.in_(cid))
+        conditions.append(Product.material_cat_id.in_(cid))
     if fid:
-        statement = statement.where(Product.material_form_id.in_(fid))
+        conditions.append(Product.material_form_id.in_(fid))
     if aid:
-        statement = statement.where(Product.applications.any(Application.application_id.in_(aid)))
+        conditions.append(Product.applications.any(Application.application_id.in_(aid)))
     if iid:
-        statement = statement.where(Product.ingredients.any(Ingredients.ingredients_id.in_(iid)))
+        conditions.append(Product.ingredients.any(Ingredients.ingredients_id.in_(iid)))
     if sid:
-        statement = statement.where(Product.suppliers.any(Supplier.supplier_id.in_(sid)))
+        conditions.append(Product.suppliers.any(Supplier.supplier_id.in_(sid)))
     if hid:
-        statement = statement.where(Product.healthclaims.any(Healthclaim.healthclaim_id.in_(hid)))
-
-    result = await session.scalars(statement=statement)
-    products = result.unique().all()
-
-    material_categories = {}
-    material_forms = {}
-    applications = {}
-    healthclaims = {}
-    ingredients_set = {}
-    suppliers_set = {}
-    
-    for p in products:
-        if p.material_cat:
-            material_categories[p.material_cat.material_cat_id] = p.material_cat
-        if p.material_form:
-            material_forms[p.material_form.material_form_id] = p.material_form
-        for app in p.applications:
-            applications[app.application_id] = app
-        for hc in p.healthclaims:
-            healthclaims[hc.healthclaim_id] = hc
-        for ing in p.ingredients:
-            ingredients_set[ing.ingredients_id] = ing
-        for sup in p.suppliers:
-            suppliers_set[sup.supplier_id] = sup
-
-    filter_options = [
-        Filter(
-            key="cid",
-            options=[FilterOption(id=mc.material_cat_id, name=mc.material_cat_name) for mc in material_categories.values()]
-        ),
-        Filter(
-            key="fid",
-            options=[FilterOption(id=mf.material_form_id, name=mf.material_form_name) for mf in material_forms.values()]
-        ),
-        Filter(
-            key="aid",
-            options=[FilterOption(id=app.application_id, name=app.application_name) for app in applications.values()]
-        ),
-        Filter(
-            key="hid",
-            options=[FilterOption(id=hc.healthclaim_id, name=hc.healthclaim_name) for hc in healthclaims.values()]
-        ),
-        Filter(
-            key="iid",
-            options=[FilterOption(id=ing.ingredients_id, name=ing.ingredients_name) for ing in ingredients_set.values()]
-        ),
-        Filter(
-            key="sid",
-            options=[FilterOption(id=sup.supplier_id, name=sup.supplier_name) for sup in suppliers_set.values()]
+        conditions.append(Product.healthclaims.any(Healthclaim.healthclaim_id.in_(hid)))
+    return conditions
+
+async def build_facet_options(session: ReadSessionDep, restrict: Optional[Callable] = None) -> list[Filter]:
+    """Facet options with counts via one GROUP BY per key; `restrict(column)` limits the product ids counted."""
+    filter_options = []
+    for key, option_model, option_id, option_name, link_model, link_option_id, link_product_id in FACET_SOURCES:
+        statement = (
+            select(option_id, option_name, func.count(link_product_id))
+            .select_from(link_model)
+            .join(option_model, link_option_id == option_id)
+            .group_by(option_id, option_name)
+            .order_by(option_name)
+        )
+        if restrict is not None:
+            statement = statement.where(restrict(link_product_id))
+
+        with timed("sql"):
+            rows = (await session.execute(statement)).all()
+        with timed("facets"):
+            filter_options.append(Filter(
+                key=key,
+                options=[FilterOption(id=id, name=name, count=count) for id, name, count in rows]
+            ))
+    return filter_options
+
+def build_index_facet_options(matched: int) -> list[Filter]:
+    with timed("facets"):
+        return [
+            Filter(key=key, options=[FilterOption(id=id, name=name, count=count) for id, name, count in options])
+            for key, options in facet_index.facets(matched)
+        ]
+
+async def get_products_from_index(
+    session: ReadSessionDep,
+    filters: dict[str, List[str]],
+    cursor: Optional[str],
+    limit: int,
+    include_total: bool,
+) -> Response:
+    with timed("facet_index"):
+        matched = facet_index.match(filters)
+        page_ids, has_more = facet_index.page(matched, decode_cursor(cursor) if cursor else None, limit)
+    with timed("sql"):
+        products = await load_product_json(session, page_ids)
+
+    return render_products_page(
+        products,
+        build_index_facet_options(matched),
+        next_cursor=encode_cursor(page_ids[-1]) if has_more else None,
+        total=matched.bit_count() if include_total else None,
+    )
+
+async def get_products_by_keyword(
+    session: ReadSessionDep,
+    keyword: str,
+    filters: dict[str, List[str]],
+    use_facet_index: bool,
+    cursor: Optional[str],
+    limit: int,
+    include_total: bool,
+) -> Response:
+    with timed("bm25"):
+        ranked = search_index.search(keyword)
+    scores = dict(ranked)
+    ranked_ids = [product_id for product_id, _ in ranked]
+
+    if use_facet_index:
+        with timed("facet_index"):
+            matching_ids = facet_index.select(ranked_ids, facet_index.match(filters))
+    elif any(filters.values()):
+        with timed("sql"):
+            result = await session.scalars(
+                select(Product.product_id).where(
+                    *build_filter_conditions(None, **filters), id_in(Product.product_id, ranked_ids)
+                )
+            )
+            allowed = set(result.all())
+        matching_ids = [product_id for product_id in ranked_ids if product_id in allowed]
+    else:
+        matching_ids = ranked_ids
+
+    # Keyset pagination on (relevance desc, product_id asc), the order search() returns.
+    start = 0
+    if cursor:
+        after_score, after_id = decode_keyword_cursor(cursor)
+        start = bisect.bisect_right(
+            matching_ids, (-after_score, after_id), key=lambda product_id: (-scores[product_id], product_id)
+        )
+    page_ids = matching_ids[start:start + limit]
+    has_more = start + limit < len(matching_ids)
+
+    if use_facet_index:
+        filter_options = build_index_facet_options(facet_index.bitmap_of(matching_ids))
+    else:
+        filter_options = await build_facet_options(session, lambda column: id_in(column, matching_ids))
+    with timed("sql"):
+        products = await load_product_json(session, page_ids)
+
+    return render_products_page(
+        products,
+        filter_options,
+        next_cursor=encode_keyword_cursor(scores[page_ids[-1]], page_ids[-1]) if has_more else None,
+        total=len(matching_ids) if include_total else None,
+    )
+
+@router.get("", response_model=ProductFilterResponse)
+async def get_products(
+    session: ReadSessionDep,
+    keyword: Optional[str] = Query(default=None, description="keyword"),
+    cid: List[str] = Query(default=[], description="material_cat_id"),
+    fid: List[str] = Query(default=[], description="material_form_id"),
+    aid: List[str] = Query(default=[], description="application_id"),
+    iid: List[str] = Query(default=[], description="ingredients_id"),
+    sid: List[str] = Query(default=[], description="supplier_id"),
+    hid: List[str] = Query(default=[], description="healthclaim_id"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor of the previous page"),
+    limit: int = Query(default=settings.PRODUCTS_PAGE_SIZE, ge=1, le=settings.PRODUCTS_MAX_PAGE_SIZE),
+    include_total: bool = Query(default=False, description="count all matching products"),
+):
+    filters = {"cid": cid, "fid": fid, "aid": aid, "iid": iid, "sid": sid, "hid": hid}
+    use_facet_index = settings.PRODUCT_FILTER_ENGINE == "index" and facet_index.ready
+
+    if keyword and search_index.ready:
+        return await get_products_by_keyword(
+            session, keyword, filters, use_facet_index, cursor, limit, include_total
         )
-    ]
-    
-    return ProductFilterResponse(products=products, filter_options=filter_options)
\ No newline at end of file
+    if use_facet_index and not keyword:
+        return await get_products_from_index(session, filters, cursor, limit, include_total)
+
+    # Until the search index is built, keywords fall back to ILIKE.
+    conditions = build_filter_conditions(keyword, **filters)
+
+    # Keyset pagination on the primary key: stable across pages and served by the pkey index.
+    page_statement = (
+        select(Product.product_id)
+        .where(*conditions)
+        .order_by(Product.product_id)
+        .limit(limit + 1)
+    )
+    if cursor:
+        page_statement = page_statement.where(Product.product_id > decode_cursor(cursor))
+
+    with timed("sql"):
+        page_ids = (await session.scalars(statement=page_statement)).all()
+
+    next_cursor = None
+    if len(page_ids) > limit:
+        page_ids = page_ids[:limit]
+        next_cursor = encode_cursor(page_ids[-1])
+
+    total = None
+    if include_total:
+        with timed("sql"):
+            total = await session.scalar(select(func.count()).select_from(Product).where(*conditions))
+
+    # Facet options describe the whole result set, not just the current page.
+    restrict = None
+    if conditions:
+        # correlate(None): the cid/fid facets select from product too, which must not correlate away this FROM.
+        matching_ids = select(Product.product_id).where(*conditions).correlate(None)
+        restrict = lambda column: column.in_(matching_ids)
+    filter_options = await build_facet_options(session, restrict)
+    with timed("sql"):
+        products = await load_product_json(session, list(page_ids))
+
+    return render_products_page(products, filter_options, next_cursor, total)
@@ -0,0 +1,42 @@
+from typing import List
+from fastapi import APIRouter, Query
+
+from core.api.deps import AIClientDep, ReadSessionDep, VectorSessionDep
+from core.config import settings
+from core.crud import load_products
+from core.models.product import ProductDetail
+from core.retrieval import hybrid_search
+from core.vector_db import build_facet_where
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get("", response_model=list[ProductDetail])
+async def search(
+    session: ReadSessionDep,
+    ai_client: AIClientDep,
+    vector_session: VectorSessionDep,
+    q: str = Query(min_length=1, description="search query"),
+    k: int = Query(default=settings.SEARCH_DEFAULT_K, ge=1, le=settings.SEARCH_MAX_K),
+    vector_timeout: float = Query(
+        default=settings.SEARCH_VECTOR_TIMEOUT, gt=0, le=settings.SEARCH_MAX_TIMEOUT, description="seconds"
+    ),
+    keyword_timeout: float = Query(
+        default=settings.SEARCH_KEYWORD_TIMEOUT, gt=0, le=settings.SEARCH_MAX_TIMEOUT, description="seconds"
+    ),
+    cid: List[str] = Query(default=[], description="material_cat_id"),
+    fid: List[str] = Query(default=[], description="material_form_id"),
+    aid: List[str] = Query(default=[], description="application_id"),
+    iid: List[str] = Query(default=[], description="ingredients_id"),
+    sid: List[str] = Query(default=[], description="supplier_id"),
+    hid: List[str] = Query(default=[], description="healthclaim_id"),
+):
+    product_ids = await hybrid_search(
+        vector_session,
+        ai_client,
+        q,
+        k,
+        where=build_facet_where({"cid": cid, "fid": fid, "aid": aid, "iid": iid, "sid": sid, "hid": hid}),
+        vector_timeout=vector_timeout,
+        keyword_timeout=keyword_timeout,
+    )
+    return await load_products(session, product_ids)
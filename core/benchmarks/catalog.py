@@ -0,0 +1,245 @@
+"""
+Fills Postgres with a seeded synthetic catalog: every table in core/models/product.py, sized by
+--products (1k/10k/100k are the sizes the load tests are run at).
+
+    python -m core.benchmarks.catalog --products 10000 [--seed 0] [--reset]
+
+Point POSTGRES_* at a local database. The same seed and size always produce the same rows; --reset
+truncates the catalog tables first and is required when the product table is not empty.
+"""
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Iterator
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel
+
+from core.db import async_engine
+from core.models.product import (
+    Application,
+    Healthclaim,
+    Image,
+    Ingredients,
+    MaterialCategory,
+    MaterialForm,
+    Product,
+    ProductApplication,
+    ProductHealthclaim,
+    ProductIngredients,
+    ProductSupplier,
+    Supplier,
+)
+
+INSERT_BATCH = 5000
+
+ADJECTIVES = [
+    "organic", "natural", "premium", "pure", "fermented", "hydrolyzed", "micronized", "cold-pressed",
+    "freeze-dried", "standardized", "concentrated", "instant", "clean-label", "vegan", "low-sugar",
+]
+INGREDIENT_WORDS = [
+    "collagen", "whey", "pea protein", "curcumin", "ginseng", "probiotic", "inulin", "vitamin c",
+    "vitamin d3", "zinc", "magnesium", "omega-3", "lutein", "green tea", "elderberry", "ashwagandha",
+    "spirulina", "chlorella", "maca", "moringa", "beetroot", "turmeric", "ginger", "matcha",
+    "hyaluronic acid", "coenzyme q10", "resveratrol", "quercetin", "glucosamine", "chondroitin",
+]
+FORMS = ["powder", "capsule", "tablet", "liquid", "granule", "softgel", "gummy", "extract"]
+CATEGORIES = [
+    "protein", "botanical", "vitamin", "mineral", "probiotic", "fiber", "lipid", "amino acid",
+    "enzyme", "sweetener", "antioxidant", "colorant", "flavor", "carbohydrate", "peptide",
+]
+APPLICATION_AREAS = [
+    "beverage", "bakery", "dairy", "confectionery", "sports nutrition", "infant formula", "snack",
+    "dietary supplement", "functional food", "pet food", "cosmetic", "meal replacement",
+]
+CLAIMS = [
+    "supports immunity", "supports joint health", "supports digestion", "reduces fatigue",
+    "supports skin elasticity", "supports muscle recovery", "supports cognitive function",
+    "supports heart health", "supports bone health", "supports sleep quality", "antioxidant",
+    "supports eye health",
+]
+CITIES = [
+    ("Taipei", None, "Taiwan"), ("Osaka", None, "Japan"), ("Lyon", None, "France"),
+    ("Toronto", "Ontario", "Canada"), ("Austin", "Texas", "USA"), ("Hamburg", None, "Germany"),
+    ("Auckland", None, "New Zealand"), ("Chennai", "Tamil Nadu", "India"),
+]
+
+# Words the load tests draw keywords and chat questions from.
+KEYWORDS = sorted({word for phrase in INGREDIENT_WORDS + APPLICATION_AREAS for word in phrase.split()})
+
+@dataclass
+class CatalogShape:
+    """Option counts for a catalog of `products` products; they grow sub-linearly, like a real catalog."""
+    products: int
+
+    @property
+    def categories(self) -> int:
+        return len(CATEGORIES)
+
+    @property
+    def forms(self) -> int:
+        return len(FORMS)
+
+    @property
+    def applications(self) -> int:
+        return min(40 + self.products // 200, 600)
+
+    @property
+    def ingredients(self) -> int:
+        return min(100 + self.products // 50, 3000)
+
+    @property
+    def suppliers(self) -> int:
+        return min(50 + self.products // 100, 2000)
+
+    @property
+    def healthclaims(self) -> int:
+        return min(30 + self.products // 1000, 200)
+
+def numbered(prefix: str, number: int) -> str:
+    return f"{prefix}{number:06d}"
+
+def option_rows(shape: CatalogShape, rng: random.Random) -> dict[type, list[dict]]:
+    rows = {
+        MaterialCategory: [
+            {"material_cat_id": numbered("C", n), "material_cat_name": name.title()}
+            for n, name in enumerate(CATEGORIES)
+        ],
+        MaterialForm: [
+            {"material_form_id": numbered("F", n), "material_form_name": name.title()}
+            for n, name in enumerate(FORMS)
+        ],
+        Application: [],
+        Ingredients: [],
+        Supplier: [],
+        Healthclaim: [],
+    }
+    for n in range(shape.applications):
+        area = APPLICATION_AREAS[n % len(APPLICATION_AREAS)]
+        rows[Application].append({
+            "application_id": numbered("A", n),
+            "application_name": f"{area.title()} {n // len(APPLICATION_AREAS) + 1}",
+            "application_desc": f"Used in {area} products such as {rng.choice(INGREDIENT_WORDS)} blends.",
+        })
+    for n in range(shape.ingredients):
+        word = INGREDIENT_WORDS[n % len(INGREDIENT_WORDS)]
+        rows[Ingredients].append({
+            "ingredients_id": numbered("I", n),
+            "ingredients_name": f"{rng.choice(ADJECTIVES).title()} {word.title()}",
+        })
+    for n in range(shape.suppliers):
+        city, province_state, country = rng.choice(CITIES)
+        rows[Supplier].append({
+            "supplier_id": numbered("S", n),
+            "supplier_name": f"{rng.choice(INGREDIENT_WORDS).title()} Ingredients {n}",
+            "supplier_cat_id": numbered("SC", n % 5),
+            "city": city,
+            "province_state": province_state,
+            "country": country,
+            "postalcode": f"{rng.randrange(10000, 99999)}",
+        })
+    for n in range(shape.healthclaims):
+        claim = CLAIMS[n % len(CLAIMS)]
+        rows[Healthclaim].append({
+            "healthclaim_id": numbered("H", n),
+            "healthclaim_name": claim if n < len(CLAIMS) else f"{claim} ({n // len(CLAIMS) + 1})",
+        })
+    return rows
+
+def product_rows(shape: CatalogShape, rng: random.Random) -> Iterator[tuple[type, dict]]:
+    """Yields (model, row) for each product, its link rows and its images."""
+    for n in range(shape.products):
+        product_id = f"P{n:08d}"
+        ingredient = rng.choice(INGREDIENT_WORDS)
+        form = rng.randrange(shape.forms)
+        area = rng.choice(APPLICATION_AREAS)
+        city, _, country = rng.choice(CITIES)
+        yield Product, {
+            "product_id": product_id,
+            "product_name": f"{rng.choice(ADJECTIVES).title()} {ingredient.title()} {FORMS[form].title()} {n}",
+            "place_of_origin": rng.choice([None, country]),
+            "manufacturing_location": f"{city}, {country}",
+            "weight_volume": f"{rng.choice([100, 250, 500, 1000, 25000])} g",
+            "features_desc": (
+                f"{rng.choice(ADJECTIVES).capitalize()} {ingredient} {FORMS[form]} for {area} applications. "
+                f"{rng.choice(CLAIMS).capitalize()}; blends well with {rng.choice(INGREDIENT_WORDS)}."
+            ),
+            "material_form_id": numbered("F", form),
+            "material_cat_id": numbered("C", rng.randrange(shape.categories)),
+        }
+        for application in rng.sample(range(shape.applications), rng.randint(1, 4)):
+            yield ProductApplication, {"product_id": product_id, "application_id": numbered("A", application)}
+        for ingredient_number in rng.sample(range(shape.ingredients), rng.randint(2, 6)):
+            yield ProductIngredients, {"product_id": product_id, "ingredients_id": numbered("I", ingredient_number)}
+        for supplier in rng.sample(range(shape.suppliers), rng.randint(1, 3)):
+            yield ProductSupplier, {"product_id": product_id, "supplier_id": numbered("S", supplier)}
+        for healthclaim in rng.sample(range(shape.healthclaims), rng.randint(0, 3)):
+            yield ProductHealthclaim, {"product_id": product_id, "healthclaim_id": numbered("H", healthclaim)}
+        for image in range(rng.randint(1, 3)):
+            yield Image, {
+                "image_id": f"{product_id}-{image}",
+                "image_url": f"https://images.example.com/{product_id}/{image}.jpg",
+                "main_image": "Y" if image == 0 else None,
+                "product_id": product_id,
+            }
+
+# Parents before children, so foreign keys hold at every flush.
+TABLE_ORDER = [
+    MaterialCategory, MaterialForm, Application, Ingredients, Supplier, Healthclaim,
+    Product, ProductApplication, ProductIngredients, ProductSupplier, ProductHealthclaim, Image,
+]
+
+async def insert_rows(session: AsyncSession, model: type, rows: list[dict]):
+    for start in range(0, len(rows), INSERT_BATCH):
+        await session.execute(insert(model.__table__), rows[start:start + INSERT_BATCH])
+
+async def populate(products: int, seed: int, reset: bool):
+    async with async_engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    shape = CatalogShape(products)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    async with AsyncSession(async_engine) as session:
+        if reset:
+            tables = ", ".join(model.__tablename__ for model in TABLE_ORDER)
+            await session.execute(text(f"TRUNCATE {tables} CASCADE"))
+        elif await session.scalar(select(func.count()).select_from(Product)):
+            raise SystemExit("The product table is not empty; pass --reset to replace the catalog")
+
+        for model, rows in option_rows(shape, rng).items():
+            await insert_rows(session, model, rows)
+
+        # Products are generated as a stream and flushed per table in batches, so 100k products
+        # never hold more than a few batches of rows in memory.
+        pending: dict[type, list[dict]] = {model: [] for model in TABLE_ORDER}
+        for model, row in product_rows(shape, rng):
+            pending[model].append(row)
+            if len(pending[Product]) >= INSERT_BATCH:
+                for child in TABLE_ORDER:
+                    await insert_rows(session, child, pending[child])
+                    pending[child] = []
+        for model in TABLE_ORDER:
+            await insert_rows(session, model, pending[model])
+        await session.commit()
+
+        counts = {
+            model.__tablename__: await session.scalar(select(func.count()).select_from(model))
+            for model in TABLE_ORDER
+        }
+    await async_engine.dispose()
+
+    print(f"Catalog with seed {seed} written in {time.perf_counter() - started:.1f}s")
+    for table, count in counts.items():
+        print(f"{table:<24}{count:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="truncate the catalog tables first")
+    args = parser.parse_args()
+    asyncio.run(populate(args.products, args.seed, args.reset))
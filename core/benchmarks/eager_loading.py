@@ -0,0 +1,85 @@
+"""
+Compares the rows Postgres returns for ProductDetail loading with the legacy seven-way joinedload
+against product_detail_options().
+
+    python -m core.benchmarks.eager_loading [--limit N]
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+
+from core.db import async_engine
+from core.models.product import Product, ProductDetail, product_detail_options
+
+def legacy_options() -> tuple:
+    return (
+        joinedload(Product.material_cat),
+        joinedload(Product.material_form),
+        joinedload(Product.applications),
+        joinedload(Product.ingredients),
+        joinedload(Product.suppliers),
+        joinedload(Product.healthclaims),
+        joinedload(Product.images),
+    )
+
+class RowCounter:
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        self.rows += max(cursor.rowcount, 0)
+
+async def run_strategy(name: str, options: tuple, limit: int | None) -> dict:
+    counter = RowCounter()
+    event.listen(async_engine.sync_engine, "after_cursor_execute", counter)
+    try:
+        async with AsyncSession(async_engine) as session:
+            statement = select(Product).options(*options).order_by(Product.product_id)
+            if limit:
+                statement = statement.limit(limit)
+
+            started = time.perf_counter()
+            result = await session.scalars(statement)
+            products = result.unique().all()
+            details = [ProductDetail.model_validate(product) for product in products]
+            elapsed = time.perf_counter() - started
+    finally:
+        event.remove(async_engine.sync_engine, "after_cursor_execute", counter)
+
+    return {
+        "strategy": name,
+        "products": len(details),
+        "statements": counter.statements,
+        "rows": counter.rows,
+        "seconds": elapsed,
+    }
+
+async def main(limit: int | None):
+    reports = [
+        await run_strategy("joinedload x7", legacy_options(), limit),
+        await run_strategy("product_detail_options", product_detail_options(), limit),
+    ]
+    await async_engine.dispose()
+
+    print(f"{'strategy':<24}{'products':>10}{'statements':>12}{'rows':>12}{'seconds':>10}")
+    for report in reports:
+        print(
+            f"{report['strategy']:<24}{report['products']:>10}{report['statements']:>12}"
+            f"{report['rows']:>12}{report['seconds']:>10.3f}"
+        )
+    legacy, tuned = reports
+    if tuned["rows"]:
+        print(f"row reduction: {legacy['rows'] / tuned['rows']:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=None, help="only load the first N products")
+    args = parser.parse_args()
+    asyncio.run(main(args.limit))
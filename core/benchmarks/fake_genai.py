@@ -0,0 +1,92 @@
+"""
+Deterministic local stand-in for `genai.Client`, covering the calls this app makes.
+
+Embeddings are hash-based bags of words: every token maps to a fixed random unit vector and a text
+embeds to the normalized sum, so texts sharing words stay close and reruns are identical. Generation
+streams a canned answer with configurable time to first token and per-chunk delay.
+"""
+import asyncio
+import hashlib
+import re
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+
+from core.ai_client import ai_session
+from core.api.deps import get_ai_client
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+@lru_cache(maxsize=65536)
+def token_vector(token: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(token.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def embed_text(text: str, dim: int) -> list[float]:
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in TOKEN.findall(text.casefold()):
+        vector += token_vector(token, dim)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+def stream_chunk(text: str):
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=text)]))])
+
+class FakeAsyncModels:
+    def __init__(self, client: "FakeGenAIClient"):
+        self.client = client
+
+    async def embed_content(self, model: str, contents):
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        self.client.embed_calls += 1
+        if self.client.embed_latency:
+            await asyncio.sleep(self.client.embed_latency)
+        return SimpleNamespace(
+            embeddings=[SimpleNamespace(values=embed_text(text, self.client.dim)) for text in texts]
+        )
+
+    async def generate_content_stream(self, model: str, contents):
+        self.client.generate_calls += 1
+        return self._stream()
+
+    async def _stream(self):
+        await asyncio.sleep(self.client.first_token_latency)
+        words = self.client.answer.split(" ")
+        for start in range(0, len(words), self.client.words_per_chunk):
+            if start:
+                await asyncio.sleep(self.client.chunk_latency)
+            yield stream_chunk(" ".join(words[start:start + self.client.words_per_chunk]) + " ")
+
+class FakeAsyncClient:
+    def __init__(self, client: "FakeGenAIClient"):
+        self.models = FakeAsyncModels(client)
+
+class FakeGenAIClient:
+    def __init__(
+        self,
+        dim: int = 768,
+        embed_latency: float = 0.0,
+        first_token_latency: float = 0.3,
+        chunk_latency: float = 0.02,
+        words_per_chunk: int = 3,
+        answer: str = (
+            "We offer **Premium Collagen Powder**, a hydrolyzed collagen suited to beverage and "
+            "supplement applications. It supports skin elasticity and blends well with vitamin c."
+        ),
+    ):
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.words_per_chunk = words_per_chunk
+        self.answer = answer
+        self.embed_calls = 0
+        self.generate_calls = 0
+        self.aio = FakeAsyncClient(self)
+
+def install(app, client: FakeGenAIClient):
+    """Serves `client` through AIClientDep and to everything that uses ai_session (index builds)."""
+    app.dependency_overrides[get_ai_client] = lambda: client
+    ai_session._client = client
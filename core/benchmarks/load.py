@@ -0,0 +1,263 @@
+"""
+Load tests for the API, served in-process with a fake model backend.
+
+    python -m core.benchmarks.load [--requests 500] [--concurrency 16] [--scenario chat ...]
+                                   [--save-baseline baseline.json | --baseline baseline.json]
+
+Runs against the catalog POSTGRES_* points to (fill one with core.benchmarks.catalog). The app is
+driven through httpx.ASGITransport, so the numbers cover routing, middleware, SQL, the indexes and
+serialization but no network. core.benchmarks.fake_genai replaces Gemini: the `ingestion` scenario
+builds the vector index with it into a temporary VECTOR_DB_PATH and /chat streams its canned answer.
+
+--save-baseline writes the report as JSON; --baseline compares against one and exits 1 when a
+scenario's p95 or throughput is more than --tolerance worse.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+SCENARIOS = [
+    "ingestion",
+    "product_detail",
+    "filter",
+    "filter_facets",
+    "filter_keyword",
+    "filter_keyword_facets",
+    "chat",
+]
+
+@dataclass
+class Fixtures:
+    product_ids: list[str]
+    category_ids: list[str]
+    application_ids: list[str]
+    keywords: list[str]
+
+# (method, url, query params, json body)
+Request = tuple[str, str, Optional[dict], Optional[dict]]
+
+def request_builders() -> dict[str, Callable[[random.Random, Fixtures], Request]]:
+    return {
+        "product_detail": lambda rng, f: ("GET", f"/products/{rng.choice(f.product_ids)}", None, None),
+        "filter": lambda rng, f: ("GET", "/products-with-filter", None, None),
+        "filter_facets": lambda rng, f: (
+            "GET", "/products-with-filter",
+            {"cid": rng.choice(f.category_ids), "aid": rng.choice(f.application_ids)}, None,
+        ),
+        "filter_keyword": lambda rng, f: (
+            "GET", "/products-with-filter", {"keyword": rng.choice(f.keywords)}, None,
+        ),
+        "filter_keyword_facets": lambda rng, f: (
+            "GET", "/products-with-filter",
+            {"keyword": rng.choice(f.keywords), "cid": rng.choice(f.category_ids)}, None,
+        ),
+        "chat": lambda rng, f: (
+            "POST", "/chat", None,
+            {"question": f"Do you have {rng.choice(f.keywords)} {rng.choice(f.keywords)} for {rng.choice(f.keywords)}?"},
+        ),
+    }
+
+def summarize(latencies: list[float], errors: int, seconds: float) -> dict:
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / seconds if seconds else 0.0,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+async def run_scenario(client, build: Callable, fixtures: Fixtures, requests: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    planned = [build(rng, fixtures) for _ in range(requests)]
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while planned:
+            method, url, params, body = planned.pop()
+            started = time.perf_counter()
+            try:
+                # ASGITransport buffers the body, so streamed /chat answers are timed to the last chunk.
+                response = await client.request(method, url, params=params, json=body)
+                failed = response.status_code >= 400
+            except Exception as e:
+                print(f"{method} {url} failed: {e}")
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def load_fixtures() -> Fixtures:
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlmodel import select
+
+    from core.benchmarks.catalog import KEYWORDS
+    from core.db import async_engine
+    from core.models.product import Application, MaterialCategory, Product
+
+    async with AsyncSession(async_engine) as session:
+        product_ids = (await session.scalars(select(Product.product_id))).all()
+        category_ids = (await session.scalars(select(MaterialCategory.material_cat_id))).all()
+        application_ids = (await session.scalars(select(Application.application_id))).all()
+    if not product_ids:
+        raise SystemExit("The catalog is empty; fill it with `python -m core.benchmarks.catalog`")
+    return Fixtures(list(product_ids), list(category_ids), list(application_ids), KEYWORDS)
+
+async def wait_until_ready(timeout: float):
+    from core.search_index import search_index
+    from core.vector_db import vector_session
+
+    deadline = time.monotonic() + timeout
+    while not (vector_session.ready and search_index.ready):
+        if time.monotonic() > deadline:
+            raise SystemExit("The app did not finish warming up")
+        await asyncio.sleep(0.1)
+
+async def run(args) -> dict:
+    import httpx
+
+    from core import build_index
+    from core.benchmarks.fake_genai import FakeGenAIClient, install
+    from core.db import dispose_engines
+    from core.main import app
+
+    fake_client = FakeGenAIClient(
+        first_token_latency=args.first_token_latency, chunk_latency=args.chunk_latency
+    )
+    install(app, fake_client)
+    fixtures = await load_fixtures()
+    reports = {}
+
+    if "ingestion" in args.scenario:
+        started = time.perf_counter()
+        result = await build_index.prepare_vector_db(blocking=True)
+        seconds = time.perf_counter() - started
+        reports["ingestion"] = {
+            "requests": len(result.changed_ids) if result else 0,
+            "errors": len(result.failed_ids) if result else 0,
+            "throughput": len(result.changed_ids) / seconds if result and seconds else 0.0,
+            "seconds": seconds,
+        }
+    else:
+        await build_index.prepare_vector_db(blocking=True)
+
+    builders = request_builders()
+    async with app.router.lifespan_context(app):
+        await wait_until_ready(args.ready_timeout)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for number, name in enumerate(args.scenario):
+                if name == "ingestion":
+                    continue
+                await run_scenario(client, builders[name], fixtures, args.warmup, args.concurrency, args.seed - 1)
+                reports[name] = await run_scenario(
+                    client, builders[name], fixtures, args.requests, args.concurrency, args.seed + number
+                )
+
+    await dispose_engines()
+
+    return {
+        "meta": {
+            "products": len(fixtures.product_ids),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "first_token_latency": args.first_token_latency,
+            "chunk_latency": args.chunk_latency,
+            "vector_store_backend": os.environ["VECTOR_STORE_BACKEND"],
+        },
+        "scenarios": reports,
+    }
+
+def print_report(report: dict):
+    meta = report["meta"]
+    print(
+        f"{meta['products']} products, {meta['requests']} requests per scenario, "
+        f"concurrency {meta['concurrency']}, {meta['vector_store_backend']} vector store"
+    )
+    print(f"{'scenario':<24}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in report["scenarios"].items():
+        if name == "ingestion":
+            print(f"{name:<24}{result['throughput']:>10.1f}{'':>30}{result['errors']:>8}"
+                  f"  ({result['requests']} products in {result['seconds']:.1f}s)")
+            continue
+        print(
+            f"{name:<24}{result['throughput']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['errors']:>8}"
+        )
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Scenarios whose p95 or throughput is more than `tolerance` worse than the baseline."""
+    if report["meta"] != baseline["meta"]:
+        print(f"Warning: the baseline was recorded with different settings: {baseline['meta']}")
+
+    print(f"\n{'scenario':<24}{'req/s vs baseline':>20}{'p95 vs baseline':>20}")
+    regressions = []
+    for name, result in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        throughput_change = result["throughput"] / base["throughput"] - 1 if base["throughput"] else 0.0
+        # Ingestion only reports throughput.
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1 if "p95_ms" in result and base.get("p95_ms") else 0.0
+        regressed = throughput_change < -tolerance or p95_change > tolerance
+        print(f"{name:<24}{throughput_change:>+20.1%}{p95_change:>+20.1%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="seconds")
+    parser.add_argument("--chunk-latency", type=float, default=0.02, help="seconds")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="numpy")
+    parser.add_argument("--ready-timeout", type=float, default=120.0, help="seconds")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as vector_db_path:
+        # Read by core.config on import, so they are set before the app is loaded.
+        os.environ.update({
+            "VECTOR_DB_PATH": vector_db_path,
+            "VECTOR_STORE_BACKEND": args.backend,
+            "VECTOR_INDEX_BUILD_IN_APP": "false",
+            "VECTOR_INDEX_RELOAD_SECONDS": "0",
+            "CATALOG_SYNC_INTERVAL": "3600",
+        })
+        report = asyncio.run(run(args))
+
+    print_report(report)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Compares query latency and per-worker memory of the Chroma and memory-mapped NumPy vector stores
+on an index of the synthetic catalog of core.benchmarks.catalog (random embeddings, but documents
+and metadata built by the same functions as core.build_index). Nothing connects to Postgres, though
+importing those modules needs the POSTGRES_* settings.
+
+    python -m core.benchmarks.vector_store [--products 50000] [--dim 768] [--queries 500] [--workers 4] [--batch 1]
+
+Each worker is a fresh process that opens the built index and runs its share of top-5 queries, like
+a gunicorn worker would. RSS counts shared pages in every process; PSS splits them between the
+processes sharing them, which is what shows the memory-mapped file being shared.
+"""
+import argparse
+import multiprocessing
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Iterator
+
+import numpy as np
+
+from core.benchmarks.catalog import CatalogShape, option_rows, product_rows
+from core.build_index import (
+    build_context_summary,
+    build_index_metadata,
+    chunked,
+    compute_content_hash,
+    convert_product_details_to_data_str,
+)
+from core.models.product import (
+    Application,
+    Healthclaim,
+    Image,
+    Ingredients,
+    MaterialCategory,
+    MaterialForm,
+    Product,
+    ProductApplication,
+    ProductHealthclaim,
+    ProductIngredients,
+    ProductSupplier,
+    Supplier,
+)
+from core.vector_store import create_vector_store
+
+WRITE_BATCH = 5000
+
+# Link table -> (product attribute, option table, option id column)
+LINKS = {
+    ProductApplication: ("applications", Application, "application_id"),
+    ProductIngredients: ("ingredients", Ingredients, "ingredients_id"),
+    ProductSupplier: ("suppliers", Supplier, "supplier_id"),
+    ProductHealthclaim: ("healthclaims", Healthclaim, "healthclaim_id"),
+}
+
+def index_record(product: SimpleNamespace) -> tuple[str, str, dict]:
+    """(product_id, document, metadata) as core.build_index.CatalogDiff builds them."""
+    document = convert_product_details_to_data_str(product)
+    content_hash = compute_content_hash(document)
+    # Shaped like ProductJSON.etag, which is the real detail hash.
+    detail_hash = f'"{compute_content_hash(product.product_id + document)[:32]}"'
+    return product.product_id, document, build_index_metadata(
+        product, content_hash, detail_hash, build_context_summary(product)
+    )
+
+def catalog_records(products: int, seed: int) -> Iterator[tuple[str, str, dict]]:
+    """Index records of the catalog `python -m core.benchmarks.catalog --products N --seed S` writes."""
+    shape = CatalogShape(products)
+    rng = random.Random(seed)
+    # Every option row starts with its id.
+    options = {
+        model: {next(iter(row.values())): SimpleNamespace(**row) for row in rows}
+        for model, rows in option_rows(shape, rng).items()
+    }
+
+    product = None
+    for model, row in product_rows(shape, rng):
+        if model is Product:
+            if product is not None:
+                yield index_record(product)
+            product = SimpleNamespace(
+                **row,
+                material_cat=options[MaterialCategory][row["material_cat_id"]],
+                material_form=options[MaterialForm][row["material_form_id"]],
+                applications=[], ingredients=[], suppliers=[], healthclaims=[], images=[],
+            )
+        elif model is Image:
+            product.images.append(SimpleNamespace(**row))
+        else:
+            attribute, option_model, option_id = LINKS[model]
+            getattr(product, attribute).append(options[option_model][row[option_id]])
+    if product is not None:
+        yield index_record(product)
+
+def build_index(backend: str, path: str, products: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+    store = create_vector_store(backend, path)
+    for batch in chunked(list(catalog_records(products, seed)), WRITE_BATCH):
+        store.upsert(
+            ids=[product_id for product_id, _, _ in batch],
+            embeddings=rng.standard_normal((len(batch), dim), dtype=np.float32).tolist(),
+            documents=[document for _, document, _ in batch],
+            metadatas=[metadata for _, _, metadata in batch],
+        )
+    store.commit()
+
+def memory_kib() -> dict[str, int]:
+    values = {}
+    for file, field in (("/proc/self/status", "VmRSS"), ("/proc/self/smaps_rollup", "Pss")):
+        try:
+            with open(file) as f:
+                for line in f:
+                    if line.startswith(f"{field}:"):
+                        values[field] = int(line.split()[1])
+        except OSError:
+            pass
+    return values
+
+def run_worker(backend: str, path: str, dim: int, queries: int, batch: int, seed: int) -> tuple[list[float], dict]:
+    store = create_vector_store(backend, path)
+    rng = np.random.default_rng(seed)
+    store.query(rng.standard_normal((1, dim), dtype=np.float32).tolist(), n_results=5)
+
+    latencies = []
+    for _ in range(max(queries // batch, 1)):
+        query_embeddings = rng.standard_normal((batch, dim), dtype=np.float32).tolist()
+        started = time.perf_counter()
+        store.query(query_embeddings, n_results=5)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, memory_kib()
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{args.products} products, dim {args.dim}, {args.workers} workers, "
+        f"{args.batch} queries per call"
+    )
+    print(f"{'backend':<10}{'p50 ms':>10}{'p99 ms':>10}{'RSS MiB/worker':>16}{'PSS MiB/worker':>16}")
+    for backend in ("chroma", "numpy"):
+        with tempfile.TemporaryDirectory() as path:
+            build_index(backend, path, args.products, args.dim, args.seed)
+            with context.Pool(args.workers) as pool:
+                reports = pool.starmap(
+                    run_worker,
+                    [
+                        (backend, path, args.dim, args.queries // args.workers, args.batch, args.seed + worker)
+                        for worker in range(args.workers)
+                    ],
+                )
+
+        latencies = np.array([latency for worker_latencies, _ in reports for latency in worker_latencies])
+        rss = np.mean([memory.get("VmRSS", 0) for _, memory in reports]) / 1024
+        pss = np.mean([memory.get("Pss", 0) for _, memory in reports]) / 1024
+        print(
+            f"{backend:<10}{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 99):>10.2f}"
+            f"{rss:>16.1f}{pss:>16.1f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500, help="total queries across all workers")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1, help="query embeddings per call")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
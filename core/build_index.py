@@ -0,0 +1,413 @@
+"""
+Builds the product vector index.
+
+    python -m core.build_index
+
+Only one process builds at a time: a file lock under VECTOR_DB_PATH serializes builders, and
+serving workers pick up each published version without restarting.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Optional
+
+from google import genai
+from sqlalchemy import select, text
+
+from core.ai_client import ai_session
+from core.config import settings
+from core.crud import ProductJSON
+from core.db import dispose_engines, read_replicas
+from core.models.product import Product, ProductDetail, product_detail_options
+from core.vector_db import vector_session
+from core.vector_store import VectorStore
+
+PRODUCT_LINK_BASE = "http://172.178.36.76:5000/product/"
+
+
+def convert_product_details_to_data_str(product_detail: ProductDetail) -> str:
+    applications = ", ".join(app.application_name for app in product_detail.applications)
+    ingredients = ", ".join(ing.ingredients_name for ing in product_detail.ingredients)
+    suppliers = ", ".join(sup.supplier_name for sup in product_detail.suppliers)
+    healthclaims = ", ".join(hc.healthclaim_name for hc in product_detail.healthclaims)
+    images = ", ".join(img.image_url for img in product_detail.images)
+    return (
+        f"Product Name: {product_detail.product_name}\n"
+        f"Origin: {product_detail.place_of_origin}\n"
+        f"Manufacturing Location: {product_detail.manufacturing_location}\n"
+        f"Weight/Volume: {product_detail.weight_volume}\n"
+        f"Features: {product_detail.features_desc}\n"
+        f"Material Category: {product_detail.material_cat.material_cat_name}\n"
+        f"Material Form: {product_detail.material_form.material_form_name}\n"
+        f"Applications: {applications or 'None'}\n"
+        f"Ingredients: {ingredients or 'None'}\n"
+        f"Suppliers: {suppliers or 'None'}\n"
+        f"Health Claims: {healthclaims or 'None'}\n"
+        f"Images: {images or 'None'}\n"
+        f"Product Link: {PRODUCT_LINK_BASE}{product_detail.product_id}"
+    )
+
+
+def build_context_summary(product_detail: ProductDetail) -> dict:
+    """
+    What the chat prompt needs of a product (see core.rag_context); images and suppliers stay in the
+    embedded document only.
+    """
+    return {
+        "Name": product_detail.product_name,
+        "Category": product_detail.material_cat.material_cat_name if product_detail.material_cat else None,
+        "Form": product_detail.material_form.material_form_name if product_detail.material_form else None,
+        "Origin": product_detail.place_of_origin,
+        "Weight/Volume": product_detail.weight_volume,
+        "Features": product_detail.features_desc,
+        "Applications": [application.application_name for application in product_detail.applications],
+        "Ingredients": [ingredient.ingredients_name for ingredient in product_detail.ingredients],
+        "Health Claims": [healthclaim.healthclaim_name for healthclaim in product_detail.healthclaims],
+        "Link": f"{PRODUCT_LINK_BASE}{product_detail.product_id}",
+    }
+
+
+# Order-independent checksum of every catalog table (row count and sum of 64-bit row hashes), computed
+# by Postgres without any rows leaving the database; catalog sync runs the diff only when it changes.
+CATALOG_CHECKSUM_SQL = " UNION ALL ".join(
+    f"SELECT '{table.name}', count(*), sum(hashtextextended(t::text, 0)::numeric) FROM \"{table.name}\" t"
+    for table in Product.metadata.sorted_tables
+)
+
+
+async def catalog_checksum() -> str:
+    async with read_replicas.session() as session:
+        rows = (await session.execute(text(CATALOG_CHECKSUM_SQL))).all()
+    return hashlib.sha256(repr(sorted(rows)).encode("utf-8")).hexdigest()
+
+
+def compute_content_hash(data_str: str) -> str:
+    return hashlib.sha256(data_str.encode("utf-8")).hexdigest()
+
+
+def build_index_metadata(product: Product, content_hash: str, detail_hash: str, summary: dict) -> dict:
+    """
+    Index metadata of a product: its content hash, the embedding model, its facet ids and the compact
+    summary the chat prompt is built from (as JSON, metadata values being scalars).
+
+    `detail_hash` covers every field the API returns, so an edit that does not change the embedded
+    text (a supplier's address, the main image) still reaches catalog sync as a metadata update.
+
+    Chroma metadata values are scalars, so multi-valued facets are stored as one boolean key per option
+    ("aid:<application_id>": True), which core.vector_db.build_facet_where filters on.
+    """
+    metadata = {
+        "content_hash": content_hash,
+        "detail_hash": detail_hash,
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "summary": json.dumps(summary),
+    }
+    if product.material_cat_id:
+        metadata["cid"] = product.material_cat_id
+    if product.material_form_id:
+        metadata["fid"] = product.material_form_id
+    for application in product.applications:
+        metadata[f"aid:{application.application_id}"] = True
+    for ingredient in product.ingredients:
+        metadata[f"iid:{ingredient.ingredients_id}"] = True
+    for supplier in product.suppliers:
+        metadata[f"sid:{supplier.supplier_id}"] = True
+    for healthclaim in product.healthclaims:
+        metadata[f"hid:{healthclaim.healthclaim_id}"] = True
+    return metadata
+
+
+def with_removed_keys(metadata: dict, indexed_metadata: dict | None) -> dict:
+    # Vector stores merge metadata on update/upsert; keys set to None are deleted.
+    removed = {key: None for key in (indexed_metadata or {}) if key not in metadata}
+    return {**metadata, **removed}
+
+
+def is_embedding_current(indexed_metadata: dict | None, metadata: dict) -> bool:
+    return (
+        indexed_metadata is not None
+        and indexed_metadata.get("content_hash") == metadata["content_hash"]
+        and indexed_metadata.get("embedding_model") == metadata["embedding_model"]
+    )
+
+
+def chunked(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+@dataclass
+class IndexBuildProgress:
+    """Progress of the build running in this process, reported by /readyz."""
+    phase: str = "idle"  # idle | diffing | embedding | publishing
+    total: int = 0
+    embedded: int = 0
+    failed: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def start(self):
+        self.__init__(phase="diffing", started_at=time.time())
+
+
+build_progress = IndexBuildProgress()
+
+
+async def run_to_completion(func, *args, on_cancel: Optional[Callable] = None):
+    """
+    asyncio.to_thread for store writes. A thread cannot be interrupted, so when the caller is cancelled
+    this still waits for `func` to return (and hands its result to `on_cancel`) before re-raising; the
+    version directory is then never discarded, nor the build lock released, while a write is running.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        if on_cancel is not None and not future.cancelled() and future.exception() is None:
+            on_cancel(future.result())
+        raise
+
+
+def is_retryable_embedding_error(e: Exception) -> bool:
+    if isinstance(e, genai.errors.ServerError):
+        return True
+    return isinstance(e, genai.errors.ClientError) and e.code == 429
+
+
+async def embed_and_upsert_batch(
+    ai_client: genai.Client,
+    store: VectorStore,
+    batch: list[tuple[str, str, dict]],
+    semaphore: asyncio.Semaphore,
+) -> list[str]:
+    """Embeds one batch of (product_id, data_str, metadata) and upserts it; returns the ids that failed."""
+    ids = [product_id for product_id, _, _ in batch]
+    documents = [data_str for _, data_str, _ in batch]
+    retries = settings.EMBEDDING_MAX_RETRIES
+
+    async with semaphore:
+        for attempt in range(retries):
+            try:
+                response = await ai_client.aio.models.embed_content(
+                    model=settings.EMBEDDING_MODEL,
+                    contents=documents,
+                )
+                embeddings = [embedding.values for embedding in response.embeddings]
+                break
+            except Exception as e:
+                if is_retryable_embedding_error(e) and attempt < retries - 1:
+                    print(f"Google API Error: {e} for batch {ids[0]}..{ids[-1]}")
+                    print(f"Retrying... ({attempt + 1}/{retries})")
+                    await asyncio.sleep(3 ** attempt)
+                else:
+                    print(f"Failed to embed batch {ids[0]}..{ids[-1]} after {attempt + 1} attempts: {e}")
+                    build_progress.failed += len(ids)
+                    return ids
+
+    try:
+        await run_to_completion(
+            functools.partial(
+                store.upsert,
+                ids=ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=[metadata for _, _, metadata in batch],
+            )
+        )
+    except Exception as e:
+        print(f"Failed to upsert batch {ids[0]}..{ids[-1]}: {e}")
+        build_progress.failed += len(ids)
+        return ids
+    build_progress.embedded += len(ids)
+    return []
+
+
+@dataclass
+class IndexBuildResult:
+    version: Optional[str] = None
+    changed_ids: list[str] = field(default_factory=list)
+    removed_ids: list[str] = field(default_factory=list)
+    failed_ids: list[str] = field(default_factory=list)
+
+
+async def prepare_vector_db(blocking: bool = True) -> Optional[IndexBuildResult]:
+    """
+    Brings the vector index in line with the catalog; returns None if another process holds the build lock.
+
+    Changes are applied to a copy of the current version, which is then published atomically, so
+    workers serving the current version are never affected by a build in progress.
+    """
+    with vector_session.build_lock(blocking) as acquired:
+        if not acquired:
+            print("Vector index is being built by another process")
+            return None
+        return await build_vector_index()
+
+
+async def build_vector_index() -> IndexBuildResult:
+    build_progress.start()
+    try:
+        return await _build_vector_index()
+    except Exception as e:
+        build_progress.error = str(e)
+        raise
+    finally:
+        build_progress.phase = "idle"
+        build_progress.finished_at = time.time()
+
+
+async def load_products(session, batch_size: int) -> AsyncIterator[list[Product]]:
+    """
+    The catalog in product id order, `batch_size` products per query, so building the ORM objects of
+    one query never holds the event loop for long.
+    """
+    last_id = None
+    while True:
+        statement = (
+            select(Product)
+            .options(*product_detail_options())
+            .order_by(Product.product_id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            statement = statement.where(Product.product_id > last_id)
+        products = (await session.scalars(statement=statement)).unique().all()
+        if not products:
+            return
+        yield products
+        last_id = products[-1].product_id
+
+
+@dataclass
+class CatalogDiff:
+    catalog_ids: set[str] = field(default_factory=set)
+    # (product_id, data_str, metadata)
+    pending: list[tuple[str, str, dict]] = field(default_factory=list)
+    # (product_id, metadata)
+    metadata_updates: list[tuple[str, dict]] = field(default_factory=list)
+
+    def add(self, products: list[Product], manifest: dict[str, dict]):
+        """Diffs `products` against the index; CPU-bound (validation, serialization, hashing), run in a thread."""
+        for product in products:
+            product_id = str(product.product_id)
+            product_detail = ProductDetail.model_validate(product)
+            data_str = convert_product_details_to_data_str(product_detail)
+            indexed_metadata = manifest.get(product_id)
+            metadata = build_index_metadata(
+                product,
+                compute_content_hash(data_str),
+                ProductJSON.from_detail(product_detail).etag,
+                build_context_summary(product_detail),
+            )
+
+            self.catalog_ids.add(product_id)
+            if not is_embedding_current(indexed_metadata, metadata):
+                self.pending.append((product_id, data_str, with_removed_keys(metadata, indexed_metadata)))
+            elif indexed_metadata != metadata:
+                # Only facet links changed: refresh the metadata without paying for an embedding.
+                self.metadata_updates.append((product_id, with_removed_keys(metadata, indexed_metadata)))
+
+
+def apply_removals_and_metadata_updates(store: VectorStore, removed_ids: list[str], metadata_updates: list):
+    for ids in chunked(removed_ids, settings.EMBEDDING_BATCH_SIZE):
+        store.delete(ids=ids)
+    for updates in chunked(metadata_updates, settings.EMBEDDING_BATCH_SIZE):
+        store.update_metadata(
+            ids=[product_id for product_id, _ in updates],
+            metadatas=[metadata for _, metadata in updates],
+        )
+
+
+async def _build_vector_index() -> IndexBuildResult:
+    # Runs inside a serving worker when it leads catalog sync, so nothing below may block the event
+    # loop for long: queries are paged, and hashing and store access run in threads.
+    manifest = await asyncio.to_thread(vector_session.get_index_manifest)
+    diff = CatalogDiff()
+    async with read_replicas.session() as session:
+        async for products in load_products(session, settings.VECTOR_INDEX_DIFF_BATCH_SIZE):
+            await asyncio.to_thread(diff.add, products, manifest)
+            # Everything needed later is in `diff`; keeps the session from holding the whole catalog.
+            session.expunge_all()
+
+    if not diff.catalog_ids:
+        print("No products found")
+        return IndexBuildResult()
+
+    ai_client = ai_session.get_client()
+    catalog_ids, pending, metadata_updates = diff.catalog_ids, diff.pending, diff.metadata_updates
+    removed_ids = [product_id for product_id in manifest if product_id not in catalog_ids]
+    if not (pending or metadata_updates or removed_ids):
+        print(f"Vector index: {len(catalog_ids)} unchanged")
+        return IndexBuildResult()
+
+    version_path, store = await run_to_completion(
+        vector_session.create_version, on_cancel=lambda created: vector_session.discard_version(*created)
+    )
+    try:
+        await run_to_completion(apply_removals_and_metadata_updates, store, removed_ids, metadata_updates)
+
+        print(
+            f"Vector index: {len(pending)} to embed, {len(metadata_updates)} metadata updates, "
+            f"{len(removed_ids)} removed, {len(catalog_ids) - len(pending)} unchanged"
+        )
+
+        build_progress.phase = "embedding"
+        build_progress.total = len(pending)
+        batches = chunked(pending, settings.EMBEDDING_BATCH_SIZE)
+        semaphore = asyncio.Semaphore(settings.EMBEDDING_CONCURRENCY)
+        results = await asyncio.gather(
+            *(embed_and_upsert_batch(ai_client, store, batch, semaphore) for batch in batches)
+        )
+
+        failed_ids = [product_id for batch_failed_ids in results for product_id in batch_failed_ids]
+        if failed_ids:
+            # Failed products stay stale in the manifest, so the next build retries them.
+            print(f"Failed to index {len(failed_ids)} products: {', '.join(failed_ids)}")
+        failed = set(failed_ids)
+        changed_ids = (
+            [product_id for product_id, _, _ in pending if product_id not in failed]
+            + [product_id for product_id, _ in metadata_updates]
+        )
+        if not (changed_ids or removed_ids):
+            # Publishing would make every worker invalidate and rebuild its indexes for nothing.
+            vector_session.discard_version(version_path, store)
+            return IndexBuildResult(failed_ids=failed_ids)
+
+        build_progress.phase = "publishing"
+        await run_to_completion(store.commit)
+    except BaseException:
+        # Unpublished versions are never pruned.
+        vector_session.discard_version(version_path, store)
+        raise
+
+    # Readers open the published version themselves.
+    store.close()
+    vector_session.publish_version(version_path, {"changed_ids": changed_ids, "removed_ids": removed_ids})
+    print(f"Vector index: published version {os.path.basename(version_path)}")
+    return IndexBuildResult(
+        version=os.path.basename(version_path),
+        changed_ids=changed_ids,
+        removed_ids=removed_ids,
+        failed_ids=failed_ids,
+    )
+
+
+async def main() -> Optional[IndexBuildResult]:
+    try:
+        return await prepare_vector_db(blocking=True)
+    finally:
+        try:
+            await ai_session.close()
+        finally:
+            await dispose_engines()
+
+
+if __name__ == "__main__":
+    result = asyncio.run(main())
+    sys.exit(1 if result is None or result.failed_ids else 0)
@@ -0,0 +1,121 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+import numpy as np
+
+V = TypeVar("V")
+
+class LRUCache(Generic[V]):
+    """In-process cache bounded by entry count, with LRU eviction, an optional TTL and hit/miss counters."""
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: V):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else math.inf
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SemanticAnswerCache:
+    """
+    Caches complete chat answers keyed by question embedding.
+
+    An entry is reused when a new question is within `max_distance` (cosine) of the cached one and
+    retrieval returned the same products with the same content hashes, so an edited product never
+    serves a stale answer.
+    """
+
+    def __init__(self, max_size: int, ttl: float, max_distance: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._next_key = 0
+        self._entries: OrderedDict[int, tuple[float, np.ndarray, dict[str, str], list[str]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, context_hashes: dict[str, str]) -> Optional[list[str]]:
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        best_key, best_distance = None, self.max_distance
+        for key, (expires_at, cached_embedding, cached_hashes, _) in list(self._entries.items()):
+            if expires_at <= now:
+                del self._entries[key]
+                continue
+            if cached_hashes != context_hashes:
+                continue
+            distance = 1.0 - float(np.dot(query, cached_embedding))
+            if distance <= best_distance:
+                best_key, best_distance = key, distance
+
+        if best_key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][3]
+
+    def store(self, embedding, context_hashes: dict[str, str], messages: list[str]):
+        if self.max_size <= 0:
+            return
+        self._entries[self._next_key] = (
+            time.monotonic() + self.ttl, self._normalize(embedding), dict(context_hashes), list(messages)
+        )
+        self._next_key += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_products(self, product_ids):
+        product_ids = set(product_ids)
+        for key, (_, _, cached_hashes, _) in list(self._entries.items()):
+            if product_ids.intersection(cached_hashes):
+                del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,138 @@
+import asyncio
+from typing import AsyncIterator, Callable, Generic, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class OverloadedError(Exception):
+    """Raised when AdmissionLimiter has no free slot and its wait queue is full or timed out."""
+
+
+class AdmissionLimiter:
+    """At most `limit` concurrent holders; up to `max_waiting` callers wait `timeout` seconds for a slot."""
+
+    def __init__(self, limit: int, max_waiting: int, timeout: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise OverloadedError()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise OverloadedError() from None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class SharedStream(Generic[T]):
+    """
+    Runs `source` once in its own task and replays everything it yields to each subscriber.
+
+    Late subscribers start from the first item. When the last subscriber leaves before the source
+    is exhausted (every client disconnected), the task is cancelled, which closes the upstream stream.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[T],
+        on_done: Optional[Callable[[], None]] = None,
+        info: Optional[dict] = None,
+    ):
+        # Filled in by the producer for its subscribers, e.g. the prompt size of a chat answer.
+        self.info = info if info is not None else {}
+        self.items: list[T] = []
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_done = on_done
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._pump(source))
+
+    @property
+    def accepting(self) -> bool:
+        return not (self.done or self.cancelled)
+
+    async def _pump(self, source: AsyncIterator[T]):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except BaseException as e:
+            # Re-raised in every subscriber.
+            self.error = e
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            self.done = True
+            self._notify()
+            if self._on_done:
+                self._on_done()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[T]:
+        self.subscribers += 1
+        try:
+            position = 0
+            while True:
+                changed = self._changed
+                while position < len(self.items):
+                    yield self.items[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.cancelled = True
+                self._task.cancel()
+
+
+class SingleFlight(Generic[T]):
+    """Concurrent callers with the same key share one SharedStream instead of starting their own."""
+
+    def __init__(self):
+        self.started = 0
+        self.joined = 0
+        self._flights: dict[Hashable, SharedStream[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: Hashable) -> Optional[SharedStream[T]]:
+        flight = self._flights.get(key)
+        if flight is None or not flight.accepting:
+            return None
+        self.joined += 1
+        return flight
+
+    def start(self, key: Hashable, source: AsyncIterator[T], info: Optional[dict] = None) -> SharedStream[T]:
+        def finish():
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+        flight = SharedStream(source, on_done=finish, info=info)
+        self._flights[key] = flight
+        self.started += 1
+        return flight
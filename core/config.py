@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import (
     PostgresDsn,
     computed_field,
@@ -14,21 +15,107 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # Read-only catalog queries go round-robin to these ("host" or "host:port"), falling back to the primary.
+    POSTGRES_READ_REPLICA_HOSTS: list[str] = []
+    # How long a replica that failed to connect is skipped.
+    POSTGRES_REPLICA_RETRY_SECONDS: float = 30.0
+    POSTGRES_CONNECT_TIMEOUT: int = 5
+    # Per engine, i.e. per host and worker process.
+    POSTGRES_POOL_SIZE: int = 10
+    POSTGRES_MAX_OVERFLOW: int = 20
+    POSTGRES_POOL_TIMEOUT: float = 10.0
+    POSTGRES_POOL_RECYCLE: int = 30 * 60
+    # psycopg prepares a statement server-side after POSTGRES_PREPARE_THRESHOLD executions on a connection.
+    # Set POSTGRES_PREPARED_STATEMENTS=false behind PgBouncer in transaction mode, which requires them off.
+    POSTGRES_PREPARED_STATEMENTS: bool = True
+    POSTGRES_PREPARE_THRESHOLD: int = 5
+
+    PRODUCTS_PAGE_SIZE: int = 24
+    PRODUCTS_MAX_PAGE_SIZE: int = 100
+    # "sql" queries Postgres for every filter request; "index" answers filters from core.facet_index.
+    PRODUCT_FILTER_ENGINE: Literal["sql", "index"] = "sql"
+    SEARCH_MAX_PREFIX_EXPANSIONS: int = 50
+    # Serialized ProductDetail JSON per product, shared by /products/{id} and /products-with-filter.
+    PRODUCT_DETAIL_CACHE_SIZE: int = 20_000
+    PRODUCT_DETAIL_CACHE_TTL: float = 60 * 60
 
     GOOGLE_API_KEY: str = ""
+    GENAI_TIMEOUT_MS: int = 60_000
+    GENAI_MAX_CONNECTIONS: int = 100
+    GENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    GENAI_KEEPALIVE_EXPIRY: float = 30.0
+    EMBEDDING_MODEL: str = "models/text-embedding-004"
+    EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_CACHE_SIZE: int = 10_000
+    EMBEDDING_CACHE_TTL: float = 24 * 60 * 60
 
-    @computed_field  # type: ignore[prop-decorator]
-    @property
-    def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
+    # Hybrid retrieval: candidates fetched per source, reciprocal-rank-fusion constant and per-source timeouts.
+    SEARCH_DEFAULT_K: int = 10
+    SEARCH_MAX_K: int = 50
+    SEARCH_CANDIDATES: int = 50
+    RRF_K: int = 60
+    SEARCH_VECTOR_TIMEOUT: float = 2.0
+    SEARCH_KEYWORD_TIMEOUT: float = 1.0
+    # Upper bound of the per-source timeouts a /search client may ask for.
+    SEARCH_MAX_TIMEOUT: float = 5.0
+    CHAT_RETRIEVER: Literal["vector", "hybrid"] = "vector"
+    # Concurrent /chat generations; up to CHAT_MAX_QUEUED more wait CHAT_QUEUE_TIMEOUT seconds, the rest get 503.
+    CHAT_MAX_CONCURRENT: int = 32
+    CHAT_MAX_QUEUED: int = 64
+    CHAT_QUEUE_TIMEOUT: float = 2.0
+    # Estimated tokens (characters / CHARS_PER_TOKEN) of retrieved product context in the chat prompt.
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 800
+    CHARS_PER_TOKEN: float = 4.0
+
+    ANSWER_CACHE_SIZE: int = 1_000
+    ANSWER_CACHE_TTL: float = 60 * 60
+    ANSWER_CACHE_MAX_DISTANCE: float = 0.05
+
+    VECTOR_DB_PATH: str = "./chroma_db"
+    # "chroma" or "numpy" (core.vector_store.NumpyVectorStore, memory-mapped and shared across workers)
+    VECTOR_STORE_BACKEND: Literal["chroma", "numpy"] = "chroma"
+    VECTOR_DB_MAX_WORKERS: int = 4
+    # Set to False when the index is built out of band with `python -m core.build_index`;
+    # workers then only follow the published versions.
+    VECTOR_INDEX_BUILD_IN_APP: bool = True
+    # How often core.catalog_sync diffs the catalog against the index and invalidates caches.
+    CATALOG_SYNC_INTERVAL: float = 60.0
+    # Products loaded and diffed per step of that diff; the hashing of each step runs in a thread.
+    VECTOR_INDEX_DIFF_BATCH_SIZE: int = 200
+    VECTOR_INDEX_RELOAD_SECONDS: float = 5.0
+    VECTOR_INDEX_KEEP_VERSIONS: int = 3
+    # Retry-After sent with the 503 from /chat while no index version is published yet.
+    CHAT_RETRY_AFTER_SECONDS: int = 10
+
+    # Sent as X-Admin-Token to enable admin-only features such as `?profile=1`; empty disables them.
+    ADMIN_TOKEN: str = ""
+    PROFILE_MAX_ROWS: int = 60
+
+    def database_uri(self, host: str, port: int) -> PostgresDsn:
         return MultiHostUrl.build(
             scheme="postgresql+psycopg",
             username=self.POSTGRES_USER,
             password=self.POSTGRES_PASSWORD,
-            host=self.POSTGRES_HOST,
-            port=self.POSTGRES_PORT,
+            host=host,
+            port=port,
             path=self.POSTGRES_DB,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
+        return self.database_uri(self.POSTGRES_HOST, self.POSTGRES_PORT)
+
+    @property
+    def read_replica_uris(self) -> list[PostgresDsn]:
+        uris = []
+        for replica in self.POSTGRES_READ_REPLICA_HOSTS:
+            host, _, port = replica.partition(":")
+            uris.append(self.database_uri(host, int(port) if port else self.POSTGRES_PORT))
+        return uris
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
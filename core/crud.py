@@ -0,0 +1,76 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import String, any_, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from core.cache import LRUCache
+from core.config import settings
+from core.events import CatalogChange, catalog_events
+from core.metrics import register_cache
+from core.models.product import Product, ProductDetail, product_detail_options
+
+@dataclass(frozen=True)
+class ProductJSON:
+    """A ProductDetail serialized exactly as the API returns it, with its strong ETag."""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_detail(cls, product_detail: ProductDetail) -> "ProductJSON":
+        body = product_detail.model_dump_json(by_alias=True).encode()
+        return cls(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+    @classmethod
+    def from_product(cls, product: Product) -> "ProductJSON":
+        return cls.from_detail(ProductDetail.model_validate(product))
+
+# Invalidated per product by catalog sync; the TTL only bounds a load racing an invalidation.
+product_detail_cache: LRUCache[ProductJSON] = LRUCache(
+    max_size=settings.PRODUCT_DETAIL_CACHE_SIZE, ttl=settings.PRODUCT_DETAIL_CACHE_TTL
+)
+register_cache("product_detail", product_detail_cache)
+
+def invalidate_product_details(change: CatalogChange):
+    if change.full:
+        product_detail_cache.clear()
+    else:
+        for product_id in change.product_ids:
+            product_detail_cache.pop(product_id)
+
+catalog_events.subscribe(invalidate_product_details)
+
+def id_in(column, product_ids: list[str]):
+    # One array parameter instead of one bind parameter per id, so long id lists stay within driver limits.
+    return column == any_(literal(product_ids, type_=ARRAY(String)))
+
+async def load_products(session: AsyncSession, product_ids: list[str]) -> list[Product]:
+    """Products with everything ProductDetail exposes, in the order of `product_ids`."""
+    if not product_ids:
+        return []
+    result = await session.scalars(
+        select(Product).options(*product_detail_options()).where(id_in(Product.product_id, product_ids))
+    )
+    products_by_id = {product.product_id: product for product in result.unique().all()}
+    return [products_by_id[product_id] for product_id in product_ids if product_id in products_by_id]
+
+async def load_product_json(session: AsyncSession, product_ids: list[str]) -> list[ProductJSON]:
+    """Serialized products in the order of `product_ids`; only cache misses are loaded from Postgres."""
+    found = {product_id: product_detail_cache.get(product_id) for product_id in product_ids}
+    missing = [product_id for product_id, product_json in found.items() if product_json is None]
+    for product in await load_products(session, missing):
+        found[product.product_id] = ProductJSON.from_product(product)
+        product_detail_cache.set(product.product_id, found[product.product_id])
+    return [found[product_id] for product_id in product_ids if found[product_id] is not None]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
+    return etag in candidates
@@ -1,10 +1,104 @@
-from sqlalchemy.ext.asyncio import create_async_engine
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Optional
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.util import greenlet_spawn
 
 from core.config import settings
 
+def create_engine(uri) -> AsyncEngine:
+    return create_async_engine(
+        str(uri),
+        pool_pre_ping=True,
+        pool_size=settings.POSTGRES_POOL_SIZE,
+        max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+        pool_timeout=settings.POSTGRES_POOL_TIMEOUT,
+        pool_recycle=settings.POSTGRES_POOL_RECYCLE,
+        connect_args={
+            # None disables prepared statements in psycopg.
+            "prepare_threshold": (
+                settings.POSTGRES_PREPARE_THRESHOLD if settings.POSTGRES_PREPARED_STATEMENTS else None
+            ),
+            "connect_timeout": settings.POSTGRES_CONNECT_TIMEOUT,
+        },
+    )
+
 # engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
-async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI), pool_pre_ping=True)
+async_engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+replica_engines = [create_engine(uri) for uri in settings.read_replica_uris]
+
+class ReplicaSession(Session):
+    """Sync session behind ReadReplicas.session(); connects on its first statement, not when it is created."""
+
+    def __init__(self, replicas: "ReadReplicas", **kwargs):
+        super().__init__(**kwargs)
+        self.replicas = replicas
+        self.replica_connection: Optional[Connection] = None
+
+    def get_bind(self, *args, **kwargs) -> Connection:
+        if self.replica_connection is None:
+            self.replica_connection = self.replicas.connect()
+        return self.replica_connection
+
+class ReadReplicas:
+    """Round-robin over the replica engines; one that fails to connect is skipped for a while."""
+
+    def __init__(self, engines: list[AsyncEngine], primary: AsyncEngine):
+        self.engines = engines
+        self.primary = primary
+        self.fallbacks = 0
+        self._next = 0
+        self._down_until = [0.0] * len(engines)
+
+    def _candidates(self) -> list[int]:
+        start, self._next = self._next, (self._next + 1) % max(len(self.engines), 1)
+        now = time.monotonic()
+        order = [(start + offset) % len(self.engines) for offset in range(len(self.engines))]
+        return [index for index in order if self._down_until[index] <= now]
+
+    def connect(self) -> Connection:
+        """A connection to the next live replica, else to the primary; runs inside the session's greenlet."""
+        for index in self._candidates():
+            try:
+                return self.engines[index].sync_engine.connect()
+            except (DBAPIError, PoolTimeoutError, OSError) as e:
+                print(f"Read replica {index} unavailable, skipping it: {e}")
+                self._down_until[index] = time.monotonic() + settings.POSTGRES_REPLICA_RETRY_SECONDS
+
+        if self.engines:
+            self.fallbacks += 1
+        return self.primary.sync_engine.connect()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncGenerator[AsyncSession, None]:
+        # Requests answered from a cache (e.g. a matching ETag) never check out a connection.
+        session = AsyncSession(sync_session_class=ReplicaSession, replicas=self, expire_on_commit=False)
+        try:
+            async with session:
+                yield session
+        finally:
+            connection = session.sync_session.replica_connection
+            if connection is not None:
+                await greenlet_spawn(connection.close)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "replicas": len(self.engines),
+            "replicas_down": sum(down_until > now for down_until in self._down_until),
+            "primary_fallbacks": self.fallbacks,
+        }
+
+read_replicas = ReadReplicas(replica_engines, async_engine)
+
+async def dispose_engines():
+    for engine in (async_engine, *replica_engines):
+        await engine.dispose()
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
 # otherwise, SQLModel might fail to initialize relationships properly
@@ -12,4 +106,4 @@ async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI), pool_p
 
 
 def init_db(session: AsyncSession) -> None:
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,35 @@
+import inspect
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+@dataclass
+class CatalogChange:
+    """Products whose indexed content changed or that left the catalog; `full` means anything may have changed."""
+    changed_ids: list[str] = field(default_factory=list)
+    removed_ids: list[str] = field(default_factory=list)
+    version: Optional[str] = None
+    full: bool = False
+
+    @property
+    def product_ids(self) -> list[str]:
+        return self.changed_ids + self.removed_ids
+
+class CatalogEvents:
+    """In-process pub/sub for catalog changes; subscribers may be plain or async callables."""
+
+    def __init__(self):
+        self._subscribers: list[Callable[[CatalogChange], object]] = []
+
+    def subscribe(self, callback: Callable[[CatalogChange], object]):
+        self._subscribers.append(callback)
+
+    async def publish(self, change: CatalogChange):
+        for callback in self._subscribers:
+            try:
+                result = callback(change)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                print(f"Error handling catalog change in {getattr(callback, '__qualname__', callback)}: {e}")
+
+catalog_events = CatalogEvents()
@@ -0,0 +1,209 @@
+import asyncio
+import bisect
+import sys
+import time
+from collections import defaultdict
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from core.models.product import (
+    Application,
+    Healthclaim,
+    Ingredients,
+    MaterialCategory,
+    MaterialForm,
+    Product,
+    ProductApplication,
+    ProductHealthclaim,
+    ProductIngredients,
+    ProductSupplier,
+    Supplier,
+)
+
+# Rows fetched (and link rows handed to a thread) at a time while building.
+BUILD_BATCH_SIZE = 5_000
+
+# (key, option id, option name) in the order facets are returned
+OPTION_SOURCES = [
+    ("cid", MaterialCategory.material_cat_id, MaterialCategory.material_cat_name),
+    ("fid", MaterialForm.material_form_id, MaterialForm.material_form_name),
+    ("aid", Application.application_id, Application.application_name),
+    ("hid", Healthclaim.healthclaim_id, Healthclaim.healthclaim_name),
+    ("iid", Ingredients.ingredients_id, Ingredients.ingredients_name),
+    ("sid", Supplier.supplier_id, Supplier.supplier_name),
+]
+
+# (key, link product id, link option id) for the many-to-many facets
+LINK_SOURCES = [
+    ("aid", ProductApplication.product_id, ProductApplication.application_id),
+    ("hid", ProductHealthclaim.product_id, ProductHealthclaim.healthclaim_id),
+    ("iid", ProductIngredients.product_id, ProductIngredients.ingredients_id),
+    ("sid", ProductSupplier.product_id, ProductSupplier.supplier_id),
+]
+
+def index_positions(rows) -> tuple[list[str], dict[str, int]]:
+    """Product ids (the first column of `rows`) sorted, and the position of each."""
+    product_ids = sorted(str(row[0]) for row in rows)
+    return product_ids, {product_id: position for position, product_id in enumerate(product_ids)}
+
+def to_bitmap(positions: list[int], size: int) -> int:
+    flags = np.zeros(size, dtype=bool)
+    flags[positions] = True
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+def from_bitmap(bits: int, size: int) -> np.ndarray:
+    packed = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(packed, count=size, bitorder="little").astype(bool)
+
+class FacetIndex:
+    """
+    In-process bitmap index over the product facets.
+
+    Every option of every FilterKey maps to a bitset (a Python int) over the products sorted by id, so
+    OR within a key is a bitwise union, AND across keys an intersection, and facet counts popcounts.
+    """
+
+    def __init__(self):
+        self.product_ids: list[str] = []
+        self.positions: dict[str, int] = {}
+        self.all_products = 0
+        self.bitmaps: dict[str, dict[str, int]] = {}
+        self.option_names: dict[str, dict[str, str]] = {}
+        self.built_at: Optional[float] = None
+        self.memory_bytes = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    async def build(self, session: AsyncSession):
+        # Runs in every worker whenever the catalog changes, so the CPU-bound steps run in threads and the
+        # event loop only waits for Postgres.
+        started = time.perf_counter()
+        rows = []
+        result = await session.stream(select(Product.product_id, Product.material_cat_id, Product.material_form_id))
+        async for product_rows in result.partitions(BUILD_BATCH_SIZE):
+            rows.extend(product_rows)
+        product_ids, positions = await asyncio.to_thread(index_positions, rows)
+
+        postings: dict[str, dict[str, list[int]]] = {key: defaultdict(list) for key, _, _ in OPTION_SOURCES}
+
+        def add_products():
+            for product_id, material_cat_id, material_form_id in rows:
+                position = positions[str(product_id)]
+                if material_cat_id:
+                    postings["cid"][material_cat_id].append(position)
+                if material_form_id:
+                    postings["fid"][material_form_id].append(position)
+
+        def add_links(key: str, link_rows):
+            for product_id, option_id in link_rows:
+                position = positions.get(str(product_id))
+                if position is not None:
+                    postings[key][option_id].append(position)
+
+        await asyncio.to_thread(add_products)
+        for key, link_product_id, link_option_id in LINK_SOURCES:
+            result = await session.stream(select(link_product_id, link_option_id))
+            async for link_rows in result.partitions(BUILD_BATCH_SIZE):
+                await asyncio.to_thread(add_links, key, link_rows)
+
+        option_names = {}
+        for key, option_id, option_name in OPTION_SOURCES:
+            option_names[key] = dict((await session.execute(select(option_id, option_name))).all())
+
+        size = len(product_ids)
+
+        def build_bitmaps() -> dict[str, dict[str, int]]:
+            return {
+                key: {option_id: to_bitmap(option_positions, size) for option_id, option_positions in options.items()}
+                for key, options in postings.items()
+            }
+
+        bitmaps = await asyncio.to_thread(build_bitmaps)
+
+        # Swap everything in one step so concurrent requests never see a half-built index.
+        self.product_ids = product_ids
+        self.positions = positions
+        self.all_products = (1 << size) - 1
+        self.bitmaps = bitmaps
+        self.option_names = option_names
+        self.memory_bytes = await asyncio.to_thread(self._measure_memory)
+        self.built_at = time.time()
+        print(
+            f"Facet index built: {size} products, "
+            f"{sum(len(options) for options in bitmaps.values())} options, "
+            f"{self.memory_bytes / 1024 / 1024:.1f} MiB in {time.perf_counter() - started:.2f}s"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "products": len(self.product_ids),
+            "options": sum(len(options) for options in self.bitmaps.values()),
+            "memory_bytes": self.memory_bytes,
+            "built_at": self.built_at,
+        }
+
+    def _measure_memory(self) -> int:
+        total = sys.getsizeof(self.product_ids) + sum(sys.getsizeof(product_id) for product_id in self.product_ids)
+        total += sys.getsizeof(self.positions)
+        for key, options in self.bitmaps.items():
+            total += sys.getsizeof(options) + sum(
+                sys.getsizeof(option_id) + sys.getsizeof(bits) for option_id, bits in options.items()
+            )
+        for names in self.option_names.values():
+            total += sys.getsizeof(names) + sum(sys.getsizeof(name) for name in names.values())
+        return total
+
+    def match(self, filters: dict[str, list[str]]) -> int:
+        matched = self.all_products
+        for key, option_ids in filters.items():
+            if not option_ids:
+                continue
+            union = 0
+            for option_id in option_ids:
+                union |= self.bitmaps[key].get(option_id, 0)
+            matched &= union
+        return matched
+
+    def bitmap_of(self, product_ids: list[str]) -> int:
+        positions = [self.positions[product_id] for product_id in product_ids if product_id in self.positions]
+        return to_bitmap(positions, len(self.product_ids))
+
+    def select(self, product_ids: list[str], matched: int) -> list[str]:
+        """The given product ids that are set in `matched`, in their original order."""
+        flags = from_bitmap(matched, len(self.product_ids))
+        return [
+            product_id for product_id in product_ids
+            if product_id in self.positions and flags[self.positions[product_id]]
+        ]
+
+    def page(self, matched: int, after: Optional[str], limit: int) -> tuple[list[str], bool]:
+        """Up to `limit` matching product ids after the cursor id, and whether more follow."""
+        start = bisect.bisect_right(self.product_ids, after) if after is not None else 0
+        bits = matched >> start
+        page_ids = []
+        while bits and len(page_ids) <= limit:
+            lowest = bits & -bits
+            page_ids.append(self.product_ids[start + lowest.bit_length() - 1])
+            bits ^= lowest
+        return page_ids[:limit], len(page_ids) > limit
+
+    def facets(self, matched: int) -> list[tuple[str, list[tuple[str, str, int]]]]:
+        facets = []
+        for key, _, _ in OPTION_SOURCES:
+            names = self.option_names.get(key, {})
+            options = []
+            for option_id, bits in self.bitmaps.get(key, {}).items():
+                count = (bits & matched).bit_count()
+                if count:
+                    options.append((option_id, names.get(option_id, option_id), count))
+            options.sort(key=lambda option: option[1])
+            facets.append((key, options))
+        return facets
+
+facet_index = FacetIndex()
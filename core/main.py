@@ -1,104 +1,79 @@
 import asyncio
-import json
+import contextlib
+import gc
+from dataclasses import asdict
 from fastapi import APIRouter, FastAPI
 from fastapi.concurrency import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
-from google import genai
-from core.models.product import Product, ProductDetail
-from core.vector_db import vector_session
-from core.db import async_engine
-from core.api.routes import chat, products, products_with_filter
+from core import build_index
+from core.ai_client import ai_session
+from core.catalog_sync import catalog_sync
+from core.events import CatalogChange, catalog_events
+from core.facet_index import facet_index
+from core.search_index import search_index
+from core.db import async_engine, dispose_engines, read_replicas, replica_engines
+from core.api.routes import chat, health, metrics, products, products_with_filter, search
 from core.config import settings
+from core.metrics import instrument_requests, pool_stats, profile_requests, register_stats
 
-def convert_product_details_to_data_str(product_detail: ProductDetail) -> str:
-    applications = ", ".join(app.application_name for app in product_detail.applications)
-    ingredients = ", ".join(ing.ingredients_name for ing in product_detail.ingredients)
-    suppliers = ", ".join(sup.supplier_name for sup in product_detail.suppliers)
-    healthclaims = ", ".join(hc.healthclaim_name for hc in product_detail.healthclaims)
-    images = ", ".join(img.image_url for img in product_detail.images)
-    return (
-        f"Product Name: {product_detail.product_name}\n"
-        f"Origin: {product_detail.place_of_origin}\n"
-        f"Manufacturing Location: {product_detail.manufacturing_location}\n"
-        f"Weight/Volume: {product_detail.weight_volume}\n"
-        f"Features: {product_detail.features_desc}\n"
-        f"Material Category: {product_detail.material_cat.material_cat_name}\n"
-        f"Material Form: {product_detail.material_form.material_form_name}\n"
-        f"Applications: {applications or 'None'}\n"
-        f"Ingredients: {ingredients or 'None'}\n"
-        f"Suppliers: {suppliers or 'None'}\n"
-        f"Health Claims: {healthclaims or 'None'}\n"
-        f"Images: {images or 'None'}\n"
-        f"Product Link: http://172.178.36.76:5000/product/{product_detail.product_id}"
-    )
+register_stats("db_pool", lambda: pool_stats(async_engine))
+for number, replica_engine in enumerate(replica_engines):
+    register_stats(f"db_pool_replica{number}", lambda engine=replica_engine: pool_stats(engine))
+register_stats("db_read", read_replicas.stats)
+register_stats("catalog_sync", catalog_sync.stats)
+register_stats("index_build", lambda: asdict(build_index.build_progress))
+register_stats("facet_index", facet_index.stats)
 
+async def refresh_catalog_indexes():
+    async with read_replicas.session() as session:
+        await search_index.build(session)
+        if settings.PRODUCT_FILTER_ENGINE == "index":
+            await facet_index.build(session)
+    # The indexes are long-lived and acyclic. Frozen, they are no longer traversed by every full garbage
+    # collection, which otherwise stalls the event loop for a long time on large catalogs; replacing
+    # them still frees them by reference counting.
+    gc.freeze()
 
-async def prepare_vector_db():
-    async with AsyncSession(async_engine) as session:
-        collection = vector_session.get_product_collection()
-        ai_client = genai.Client(api_key=settings.GOOGLE_API_KEY)
-
-        result = await session.scalars(statement=select(Product).options(
-            joinedload(Product.material_cat),
-            joinedload(Product.material_form),
-            joinedload(Product.applications),
-            joinedload(Product.ingredients),
-            joinedload(Product.suppliers),
-            joinedload(Product.healthclaims),
-            joinedload(Product.images)
-        ))
-
-        products = result.unique().all()
-
-        if (len(products) == 0):
-            print("No products found")
-            exit()
+async def refresh_catalog_indexes_on_change(change: CatalogChange):
+    try:
+        await refresh_catalog_indexes()
+    except Exception as e:
+        print(f"Error refreshing catalog indexes: {e}")
 
-        for product in products:
-            product_detail = ProductDetail.model_validate(product)
-            data_str = convert_product_details_to_data_str(product_detail)
-            
-            retries = 3
-            for attempt in range(retries):
-                try:
-                    response = ai_client.models.embed_content(
-                        model="models/text-embedding-004",
-                        contents=data_str,
-                    )
-                    embedding_vectors = response.embeddings[0].values
-                    break
-                except genai.errors.ServerError as e:
-                    if attempt < retries - 1:
-                        print(f"Google API 503 Error: {e} for product {product.id}")
-                        print(f"Retrying... ({attempt + 1}/{retries})")
-                        await asyncio.sleep(3 ** attempt)
-                    else:
-                        print(f"Failed to embed product {product.id} after {retries} attempts")
-                        return 
-                except Exception as e:
-                    raise e
+async def warm_up():
+    try:
+        await refresh_catalog_indexes()
+    except Exception as e:
+        print(f"Error building catalog indexes, falling back to SQL: {e}")
+    catalog_events.subscribe(refresh_catalog_indexes_on_change)
 
-            collection.add(
-                ids=[str(product.product_id)], 
-                embeddings=[embedding_vectors], 
-                documents=[data_str]
-            )
+    # The first sync builds (or follows) the vector index; with several workers only the one holding
+    # the build lock embeds, the others serve the current version and switch once a new one is published.
+    await catalog_sync.run()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
-        await prepare_vector_db()
-        print("Vector database prepared successfully")
-    except Exception as e:
-        print(f"Error preparing vector database: {e}")
+        ai_session.get_client()
+    except ValueError as e:
+        # Missing GOOGLE_API_KEY: only /chat and the index build need the client, so keep serving the catalog.
+        print(f"Gemini client not available: {e}")
+
+    # Runs in the background so catalog endpoints serve traffic while the index is built;
+    # /readyz reports progress and /chat answers 503 until a version is published.
+    warm_up_task = asyncio.create_task(warm_up())
 
     yield
-    
-    vector_session.clean_up()
-    print("Vector database cleaned up")
+
+    warm_up_task.cancel()
+    # A cancelled build first waits for its running store write (build_index.run_to_completion) and
+    # discards its unpublished version; only then may another process take the build lock.
+    with contextlib.suppress(asyncio.CancelledError):
+        await warm_up_task
+    catalog_sync.stop()
+
+    await ai_session.close()
+    await dispose_engines()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -108,10 +83,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing", "X-Prompt-Tokens", "X-Context-Products", "X-Context-Dropped"],
 )
+app.middleware("http")(profile_requests)
+app.middleware("http")(instrument_requests)
 api_router = APIRouter()
+api_router.include_router(health.router)
+api_router.include_router(metrics.router)
 api_router.include_router(products.router)
 api_router.include_router(products_with_filter.router)
+api_router.include_router(search.router)
 api_router.include_router(chat.router)
 
 app.include_router(api_router)
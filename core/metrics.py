@@ -0,0 +1,173 @@
+"""
+Hot-path instrumentation.
+
+`timed(stage)` records a stage into the `app_stage_seconds` histogram and, during a request, into
+that response's Server-Timing header. Stages that finish after the headers were sent (the LLM stream
+of /chat) use `observe_stage` and only show up in /metrics. Caches and stats providers register here
+and are read at scrape time.
+"""
+import asyncio
+import cProfile
+import io
+import pstats
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from prometheus_client import REGISTRY, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from core.config import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_SECONDS = Histogram(
+    "app_request_seconds",
+    "Time until the response headers are ready",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "app_stage_seconds",
+    "Time spent in one stage of a request",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROMPT_TOKENS = Histogram(
+    "app_prompt_tokens",
+    "Prompt tokens per LLM call, estimated before the call and as reported by the model",
+    ["kind"],
+    buckets=(100, 200, 400, 800, 1200, 1600, 2400, 3200, 6400, 12800),
+)
+
+_server_timings: ContextVar[Optional[dict[str, float]]] = ContextVar("server_timings", default=None)
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _server_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+def format_server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+async def instrument_requests(request: Request, call_next):
+    timings: dict[str, float] = {}
+    token = _server_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _server_timings.reset(token)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(elapsed)
+
+    timings["total"] = elapsed
+    response.headers["Server-Timing"] = format_server_timing(timings)
+    return response
+
+
+def is_admin(request: Request) -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(settings.ADMIN_TOKEN) and secrets.compare_digest(token, settings.ADMIN_TOKEN)
+
+# cProfile allows one active profiler per interpreter.
+_profile_lock = asyncio.Lock()
+
+async def profile_requests(request: Request, call_next):
+    """
+    `?profile=1` with a valid X-Admin-Token returns cProfile stats instead of the response.
+
+    The profiler sees the whole event loop while enabled, so concurrent requests show up as well;
+    streamed bodies are consumed inside the profile so /chat includes the LLM stream.
+    """
+    if request.query_params.get("profile") != "1":
+        return await call_next(request)
+    if not is_admin(request):
+        return PlainTextResponse("Profiling requires a valid X-Admin-Token", status_code=403)
+    if _profile_lock.locked():
+        return PlainTextResponse("Another request is being profiled", status_code=409)
+
+    async with _profile_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = await call_next(request)
+            async for _ in response.body_iterator:
+                pass
+        finally:
+            profiler.disable()
+
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(settings.PROFILE_MAX_ROWS)
+    return PlainTextResponse(output.getvalue(), headers={"X-Profiled-Status": str(response.status_code)})
+
+
+class AppCollector:
+    """Reads registered caches and stats providers whenever /metrics is scraped."""
+
+    def __init__(self):
+        self.caches: dict[str, object] = {}
+        self.stats: dict[str, Callable[[], dict]] = {}
+
+    def collect(self):
+        hits = CounterMetricFamily("app_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("app_cache_misses", "Cache misses", labels=["cache"])
+        hit_ratio = GaugeMetricFamily("app_cache_hit_ratio", "Cache hits per lookup", labels=["cache"])
+        for name, cache in self.caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            lookups = cache.hits + cache.misses
+            hit_ratio.add_metric([name], cache.hits / lookups if lookups else 0.0)
+        yield hits
+        yield misses
+        yield hit_ratio
+
+        for prefix, provider in self.stats.items():
+            try:
+                values = provider()
+            except Exception as e:
+                print(f"Error collecting {prefix} metrics: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (bool, int, float)):
+                    yield GaugeMetricFamily(f"app_{prefix}_{key}", f"{prefix} {key}", value=float(value))
+
+collector = AppCollector()
+REGISTRY.register(collector)
+
+def register_cache(name: str, cache):
+    """`cache` exposes hits and misses counters (core.cache.LRUCache, SemanticAnswerCache)."""
+    collector.caches[name] = cache
+
+def register_stats(prefix: str, provider: Callable[[], dict]):
+    """Numeric and boolean values of `provider()` are exported as app_<prefix>_<key> gauges."""
+    collector.stats[prefix] = provider
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
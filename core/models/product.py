@@ -1,4 +1,5 @@
 from typing import Optional
+from sqlalchemy.orm import joinedload, selectinload
 from sqlmodel import Field, Relationship, SQLModel
 
 from core.util import BaseSchema
@@ -130,11 +131,32 @@ class Product(ProductBase, table=True):
     material_cat_id: str = Field(foreign_key="material_category.material_cat_id")
     material_form: Optional["MaterialForm"] = Relationship(back_populates="products")
     material_cat: Optional["MaterialCategory"] = Relationship(back_populates="products")
-    applications: list["Application"] = Relationship(back_populates="products", link_model=ProductApplication)
-    ingredients: list["Ingredients"] = Relationship(back_populates="products", link_model=ProductIngredients)
-    suppliers: list["Supplier"] = Relationship(back_populates="products", link_model=ProductSupplier)
-    healthclaims: list["Healthclaim"] = Relationship(back_populates="products", link_model=ProductHealthclaim)
-    images: list["Image"] = Relationship(back_populates="product")
+    applications: list["Application"] = Relationship(back_populates="products", link_model=ProductApplication, sa_relationship_kwargs={"order_by": "Application.application_id"})
+    ingredients: list["Ingredients"] = Relationship(back_populates="products", link_model=ProductIngredients, sa_relationship_kwargs={"order_by": "Ingredients.ingredients_id"})
+    suppliers: list["Supplier"] = Relationship(back_populates="products", link_model=ProductSupplier, sa_relationship_kwargs={"order_by": "Supplier.supplier_id"})
+    healthclaims: list["Healthclaim"] = Relationship(back_populates="products", link_model=ProductHealthclaim, sa_relationship_kwargs={"order_by": "Healthclaim.healthclaim_id"})
+    images: list["Image"] = Relationship(back_populates="product", sa_relationship_kwargs={"order_by": "Image.image_id"})
+
+def product_detail_options() -> tuple:
+    """
+    Loader options for every relationship ProductDetail exposes.
+
+    Collections are ordered by id (see the relationships above), so a product always serializes to the
+    same bytes and its content hash and ETag only change when the product does.
+
+    Many-to-one relations are joined; collections are loaded with one SELECT ... IN per relation,
+    so the row count grows with the sum of the collection sizes instead of their product.
+    """
+    return (
+        joinedload(Product.material_cat),
+        joinedload(Product.material_form),
+        selectinload(Product.applications),
+        selectinload(Product.ingredients),
+        selectinload(Product.suppliers),
+        selectinload(Product.healthclaims),
+        selectinload(Product.images),
+    )
+
 class ProductDetail(ProductBase):
     material_cat: Optional["MaterialCategoryPublic"] = None
     material_form: Optional["MaterialFormPublic"] = None
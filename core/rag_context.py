@@ -0,0 +1,83 @@
+"""
+Builds the product context of the chat prompt from the compact summaries stored in the index
+(core.build_index.build_context_summary).
+
+Fields every retrieved product shares are stated once, list items all of them share likewise, and
+the lowest-ranked products are dropped until the context fits CHAT_CONTEXT_TOKEN_BUDGET, so the
+prompt size no longer depends on how rich the retrieved products are.
+"""
+import math
+from dataclasses import dataclass
+
+from core.config import settings
+
+NO_CONTEXT = "No relevant information found."
+
+def estimate_tokens(text: str) -> int:
+    # Rough but cheap; the exact count comes back in the response's usage_metadata.
+    return math.ceil(len(text) / settings.CHARS_PER_TOKEN)
+
+@dataclass
+class PromptContext:
+    text: str
+    tokens: int
+    products: int
+    dropped: int = 0
+
+def format_value(value) -> str:
+    return ", ".join(value) if isinstance(value, list) else str(value)
+
+def split_shared(summaries: list[dict]) -> tuple[dict, list[dict]]:
+    """Moves fields (and list items) every summary has in common into one shared dict."""
+    if len(summaries) < 2:
+        return {}, summaries
+
+    shared = {}
+    for name, value in summaries[0].items():
+        values = [summary.get(name) for summary in summaries]
+        if isinstance(value, list):
+            common = [item for item in value if all(item in (other or []) for other in values[1:])]
+            if common:
+                shared[name] = common
+        elif value and all(other == value for other in values[1:]):
+            shared[name] = value
+
+    rest = []
+    for summary in summaries:
+        remaining = {}
+        for name, value in summary.items():
+            if name not in shared:
+                remaining[name] = value
+            elif isinstance(value, list):
+                items = [item for item in value if item not in shared[name]]
+                if items:
+                    remaining[name] = items
+        rest.append(remaining)
+    return shared, rest
+
+def render(summaries: list[dict]) -> str:
+    shared, rest = split_shared(summaries)
+    lines = []
+    if shared:
+        lines.append("Shared by all products:")
+        lines.extend(f"- {name}: {format_value(value)}" for name, value in shared.items())
+        lines.append("Products:")
+    for number, summary in enumerate(rest, start=1):
+        fields = "; ".join(f"{name}: {format_value(value)}" for name, value in summary.items() if value)
+        lines.append(f"{number}. {fields}")
+    return "\n".join(lines)
+
+def build_prompt_context(summaries: list[dict], budget: int) -> PromptContext:
+    """Context for the highest-ranked summaries that fit `budget` estimated tokens."""
+    if not summaries:
+        return PromptContext(text=NO_CONTEXT, tokens=estimate_tokens(NO_CONTEXT), products=0)
+
+    for count in range(len(summaries), 0, -1):
+        text = render(summaries[:count])
+        tokens = estimate_tokens(text)
+        if tokens <= budget:
+            return PromptContext(text=text, tokens=tokens, products=count, dropped=len(summaries) - count)
+
+    # Even the best match alone is over budget: keep it, cut to the budget.
+    text = text[:int(budget * settings.CHARS_PER_TOKEN)]
+    return PromptContext(text=text, tokens=estimate_tokens(text), products=1, dropped=len(summaries) - 1)
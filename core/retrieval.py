@@ -0,0 +1,169 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Optional
+
+from google import genai
+
+from core.cache import LRUCache
+from core.config import settings
+from core.metrics import register_cache, timed
+from core.rag_context import PromptContext, build_prompt_context
+from core.search_index import search_index
+from core.vector_db import VectorSession
+
+embedding_cache: LRUCache[list[float]] = LRUCache(
+    max_size=settings.EMBEDDING_CACHE_SIZE, ttl=settings.EMBEDDING_CACHE_TTL
+)
+register_cache("embedding", embedding_cache)
+
+def normalize_question(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+async def get_embedding(client: genai.Client, text):
+    cache_key = (settings.EMBEDDING_MODEL, normalize_question(text))
+    embedding = embedding_cache.get(cache_key)
+    if embedding is not None:
+        return embedding
+
+    with timed("embed"):
+        response = await client.aio.models.embed_content(
+            model=settings.EMBEDDING_MODEL,
+            contents=text,
+        )
+    embedding = response.embeddings[0].values
+    embedding_cache.set(cache_key, embedding)
+    return embedding
+
+def summary_of(document: str, metadata: Optional[dict]) -> dict:
+    summary = (metadata or {}).get("summary")
+    # Versions built before summaries were stored only have the full document.
+    return json.loads(summary) if summary else {"Details": document}
+
+@dataclass
+class RetrievedContext:
+    documents: list[str] = field(default_factory=list)
+    # Compact per-product summaries in rank order, see core.rag_context
+    summaries: list[dict] = field(default_factory=list)
+    # product_id -> content_hash of every retrieved document, used to validate cached answers
+    content_hashes: dict[str, str] = field(default_factory=dict)
+
+    def prompt_context(self, budget: int = settings.CHAT_CONTEXT_TOKEN_BUDGET) -> PromptContext:
+        return build_prompt_context(self.summaries, budget)
+
+    @classmethod
+    def from_results(cls, ids: list[str], documents: list[str], metadatas: list[dict]) -> "RetrievedContext":
+        return cls(
+            documents=documents,
+            summaries=[summary_of(document, metadata) for document, metadata in zip(documents, metadatas)],
+            content_hashes={
+                product_id: (metadata or {}).get("content_hash", "")
+                for product_id, metadata in zip(ids, metadatas)
+            },
+        )
+
+async def retrieve_from_vector_db(
+    vector_session: VectorSession, query_embedding, n_results: int = 5, where: Optional[dict] = None
+) -> RetrievedContext:
+    results = await vector_session.query_products(
+        query_embeddings=[query_embedding], n_results=n_results, where=where
+    )
+
+    if not results["documents"] or not results["documents"][0]:
+        return RetrievedContext()
+
+    return RetrievedContext.from_results(results["ids"][0], results["documents"][0], results["metadatas"][0])
+
+async def retrieve_by_ids(vector_session: VectorSession, product_ids: list[str]) -> RetrievedContext:
+    if not product_ids:
+        return RetrievedContext()
+    results = await vector_session.get_products(ids=product_ids, include=["documents", "metadatas"])
+    by_id = {
+        product_id: (document, metadata)
+        for product_id, document, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+    }
+    ids = [product_id for product_id in product_ids if product_id in by_id]
+    return RetrievedContext.from_results(
+        ids, [by_id[product_id][0] for product_id in ids], [by_id[product_id][1] for product_id in ids]
+    )
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = settings.RRF_K) -> list[str]:
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, product_id in enumerate(ranking, start=1):
+            scores[product_id] = scores.get(product_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda product_id: scores[product_id], reverse=True)
+
+async def with_timeout(source: str, coroutine, timeout: float) -> list[str]:
+    # A slow or failing source only costs recall; the other source still answers.
+    try:
+        return await asyncio.wait_for(coroutine, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"{source} retrieval timed out after {timeout}s")
+    except Exception as e:
+        print(f"{source} retrieval failed: {e}")
+    return []
+
+async def vector_product_ids(
+    vector_session: VectorSession,
+    ai_client: genai.Client,
+    query: str,
+    n_results: int,
+    query_embedding=None,
+    where: Optional[dict] = None,
+) -> list[str]:
+    if query_embedding is None:
+        query_embedding = await get_embedding(ai_client, query)
+    results = await vector_session.query_products(
+        query_embeddings=[query_embedding], n_results=n_results, where=where, include=[]
+    )
+    return results["ids"][0] if results["ids"] else []
+
+async def keyword_product_ids(
+    vector_session: VectorSession, query: str, n_results: int, where: Optional[dict] = None
+) -> list[str]:
+    # In a thread, so with_timeout can give up on a slow search instead of waiting for it to return.
+    with timed("bm25"):
+        ranked_ids = [product_id for product_id, _ in await asyncio.to_thread(search_index.search, query)]
+    if where is not None:
+        # The same where-clause as the vector side, so both sources honour identical facet filters.
+        allowed = set((await vector_session.get_products(where=where, include=[]))["ids"])
+        ranked_ids = [product_id for product_id in ranked_ids if product_id in allowed]
+    return ranked_ids[:n_results]
+
+async def hybrid_search(
+    vector_session: VectorSession,
+    ai_client: genai.Client,
+    query: str,
+    k: int,
+    query_embedding=None,
+    where: Optional[dict] = None,
+    vector_timeout: float = settings.SEARCH_VECTOR_TIMEOUT,
+    keyword_timeout: float = settings.SEARCH_KEYWORD_TIMEOUT,
+) -> list[str]:
+    """Top-k product ids from vector and keyword retrieval run in parallel, fused with reciprocal-rank fusion."""
+    candidates = max(k, settings.SEARCH_CANDIDATES)
+    vector_ids, keyword_ids = await asyncio.gather(
+        with_timeout(
+            "Vector",
+            vector_product_ids(vector_session, ai_client, query, candidates, query_embedding, where),
+            vector_timeout,
+        ),
+        with_timeout(
+            "Keyword",
+            keyword_product_ids(vector_session, query, candidates, where),
+            keyword_timeout,
+        ),
+    )
+    return reciprocal_rank_fusion([vector_ids, keyword_ids])[:k]
+
+async def retrieve_hybrid_context(
+    vector_session: VectorSession,
+    ai_client: genai.Client,
+    query: str,
+    query_embedding,
+    n_results: int = 5,
+    where: Optional[dict] = None,
+) -> RetrievedContext:
+    product_ids = await hybrid_search(vector_session, ai_client, query, n_results, query_embedding, where)
+    return await retrieve_by_ids(vector_session, product_ids)
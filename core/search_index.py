@@ -0,0 +1,173 @@
+import asyncio
+import bisect
+import math
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from core.config import settings
+from core.models.product import Application, Ingredients, Product, ProductApplication, ProductIngredients
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Rows fetched (and link rows handed to a thread) at a time while building.
+BUILD_BATCH_SIZE = 5_000
+
+# Term-frequency multipliers per field, so a hit in the product name outranks one in the features text.
+FIELD_WEIGHTS = {
+    "product_name": 3.0,
+    "applications": 2.0,
+    "ingredients": 2.0,
+    "features_desc": 1.0,
+}
+
+# (field, product id, text) of the many-to-many text fields
+LINK_SOURCES = [
+    ("applications", select(ProductApplication.product_id, Application.application_name)
+        .join(Application, Application.application_id == ProductApplication.application_id)),
+    ("ingredients", select(ProductIngredients.product_id, Ingredients.ingredients_name)
+        .join(Ingredients, Ingredients.ingredients_id == ProductIngredients.ingredients_id)),
+]
+
+def index_positions(rows) -> tuple[list[str], dict[str, int]]:
+    """Product ids (the first column of `rows`) sorted, and the position of each."""
+    product_ids = sorted(str(row[0]) for row in rows)
+    return product_ids, {product_id: position for position, product_id in enumerate(product_ids)}
+
+def tokenize(text: Optional[str]) -> list[str]:
+    return TOKEN_PATTERN.findall(text.casefold()) if text else []
+
+@dataclass(frozen=True)
+class SearchSnapshot:
+    """One build of the search index; never modified, so searches in threads can run while the next one is built."""
+    product_ids: list[str]
+    # term -> (product positions, weighted term frequencies)
+    postings: dict[str, tuple[np.ndarray, np.ndarray]]
+    vocabulary: list[str]
+    doc_lengths: np.ndarray
+    avg_doc_length: float
+    built_at: float
+
+    def expand(self, term: str) -> list[str]:
+        # Prefix matches keep "oat" finding "oats", like the substring match this index replaces.
+        start = bisect.bisect_left(self.vocabulary, term)
+        expansions = []
+        for candidate in self.vocabulary[start:start + settings.SEARCH_MAX_PREFIX_EXPANSIONS]:
+            if not candidate.startswith(term):
+                break
+            expansions.append(candidate)
+        return expansions
+
+class SearchIndex:
+    """
+    In-process inverted index with BM25 ranking over product name, application names, ingredients and features.
+
+    Link rows are streamed from Postgres while building, and postings are stored as NumPy arrays of
+    (product position, weighted term frequency), so large link tables never sit in memory as ORM objects.
+    A build publishes a new SearchSnapshot in one assignment and search() reads it once.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.snapshot: Optional[SearchSnapshot] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    async def build(self, session: AsyncSession):
+        # Runs in every worker whenever the catalog changes, so the CPU-bound steps run in threads and the
+        # event loop only waits for Postgres.
+        started = time.perf_counter()
+        rows = []
+        result = await session.stream(select(Product.product_id, Product.product_name, Product.features_desc))
+        async for product_rows in result.partitions(BUILD_BATCH_SIZE):
+            rows.extend(product_rows)
+        product_ids, positions = await asyncio.to_thread(index_positions, rows)
+
+        term_docs: dict[str, dict[int, float]] = defaultdict(dict)
+        doc_lengths = np.zeros(len(product_ids), dtype=np.float32)
+
+        def add(position: int, field: str, text: Optional[str]):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                docs = term_docs[token]
+                docs[position] = docs.get(position, 0.0) + weight
+                doc_lengths[position] += weight
+
+        def add_products():
+            for product_id, product_name, features_desc in rows:
+                position = positions[str(product_id)]
+                add(position, "product_name", product_name)
+                add(position, "features_desc", features_desc)
+
+        def add_links(field: str, link_rows):
+            for product_id, text in link_rows:
+                position = positions.get(str(product_id))
+                if position is not None:
+                    add(position, field, text)
+
+        def build_postings() -> dict[str, tuple[np.ndarray, np.ndarray]]:
+            return {
+                term: (
+                    np.fromiter(docs.keys(), dtype=np.int32, count=len(docs)),
+                    np.fromiter(docs.values(), dtype=np.float32, count=len(docs)),
+                )
+                for term, docs in term_docs.items()
+            }
+
+        await asyncio.to_thread(add_products)
+        for field, statement in LINK_SOURCES:
+            result = await session.stream(statement)
+            async for link_rows in result.partitions(BUILD_BATCH_SIZE):
+                await asyncio.to_thread(add_links, field, link_rows)
+        postings = await asyncio.to_thread(build_postings)
+        vocabulary = await asyncio.to_thread(sorted, postings)
+
+        self.snapshot = SearchSnapshot(
+            product_ids=product_ids,
+            postings=postings,
+            vocabulary=vocabulary,
+            doc_lengths=doc_lengths,
+            avg_doc_length=float(doc_lengths.mean()) if len(doc_lengths) else 0.0,
+            built_at=time.time(),
+        )
+        print(
+            f"Search index built: {len(product_ids)} products, {len(postings)} terms "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+    def search(self, query: str) -> list[tuple[str, float]]:
+        """(product_id, score) of products matching every query term, best first; ties keep id order."""
+        snapshot = self.snapshot
+        terms = tokenize(query)
+        size = len(snapshot.product_ids) if snapshot else 0
+        if not terms or not size:
+            return []
+
+        scores = np.zeros(size, dtype=np.float32)
+        matched_terms = np.zeros(size, dtype=np.int32)
+        for term in terms:
+            term_scores = np.zeros(size, dtype=np.float32)
+            for candidate in snapshot.expand(term):
+                positions, frequencies = snapshot.postings[candidate]
+                idf = math.log(1 + (size - len(positions) + 0.5) / (len(positions) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * snapshot.doc_lengths[positions] / snapshot.avg_doc_length)
+                candidate_scores = idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+                term_scores[positions] = np.maximum(term_scores[positions], candidate_scores)
+            matched_terms += term_scores > 0
+            scores += term_scores
+
+        hits = np.flatnonzero(matched_terms == len(terms))
+        ranked = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(snapshot.product_ids[position], float(scores[position])) for position in ranked]
+
+search_index = SearchIndex()
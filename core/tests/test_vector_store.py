@@ -0,0 +1,70 @@
+"""
+Metadata semantics of the vector store backends against real stores.
+
+    python -m pytest core/tests
+"""
+import pytest
+
+from core.vector_store import ChromaVectorStore, NumpyVectorStore
+
+@pytest.fixture(params=[ChromaVectorStore, NumpyVectorStore])
+def store(request, tmp_path):
+    store = request.param(str(tmp_path))
+    store.upsert(
+        ids=["P1", "P2"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+        documents=["first", "second"],
+        metadatas=[
+            {"content_hash": "a", "cid": "C1", "aid:A1": True, "aid:A2": True},
+            {"content_hash": "b", "cid": "C1", "aid:A1": True},
+        ],
+    )
+    store.commit()
+    return store
+
+def stored(store, product_id: str) -> tuple[str, dict]:
+    result = store.get(ids=[product_id])
+    return result["documents"][0], result["metadatas"][0]
+
+def test_upsert_removes_keys_set_to_none(store):
+    store.upsert(
+        ids=["P1"],
+        embeddings=[[0.0, 0.0, 1.0]],
+        documents=["first, edited"],
+        metadatas=[{"content_hash": "c", "aid:A2": None}],
+    )
+    store.commit()
+
+    assert stored(store, "P1") == ("first, edited", {"content_hash": "c", "cid": "C1", "aid:A1": True})
+    assert store.get(where={"aid:A2": True})["ids"] == []
+    assert store.query(query_embeddings=[[0.0, 0.0, 1.0]], n_results=1)["ids"] == [["P1"]]
+
+def test_update_metadata_removes_keys_and_keeps_the_embedding(store):
+    store.update_metadata(
+        ids=["P1", "P2"],
+        metadatas=[{"aid:A1": None}, {"cid": "C2"}],
+    )
+    store.commit()
+
+    assert stored(store, "P1") == ("first", {"content_hash": "a", "cid": "C1", "aid:A2": True})
+    assert stored(store, "P2") == ("second", {"content_hash": "b", "cid": "C2", "aid:A1": True})
+    assert store.get(where={"aid:A1": True})["ids"] == ["P2"]
+    assert store.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=1)["ids"] == [["P1"]]
+
+def test_filters_on_facet_flags_and_other_keys(store):
+    assert sorted(store.get(where={"$and": [{"cid": {"$in": ["C1"]}}, {"aid:A1": {"$eq": True}}]})["ids"]) == ["P1", "P2"]
+    assert store.get(where={"content_hash": "b"})["ids"] == ["P2"]
+
+def test_distances_are_cosine(store):
+    result = store.query(query_embeddings=[[2.0, 0.0, 0.0]], n_results=2)
+    assert result["ids"] == [["P1", "P2"]]
+    assert result["distances"][0] == pytest.approx([0.0, 1.0], abs=1e-6)
+
+def test_close_releases_the_chroma_system(tmp_path):
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    systems = len(SharedSystemClient._identifier_to_system)
+    store = ChromaVectorStore(str(tmp_path))
+    store.get(ids=["P1"])
+    store.close()
+    assert len(SharedSystemClient._identifier_to_system) == systems
@@ -1,19 +1,235 @@
-import chromadb
+import asyncio
+import fcntl
+import functools
+import json
+import math
+import os
 import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import IO, Optional
+
+from core.config import settings
+from core.metrics import timed
+from core.vector_store import VectorStore, create_vector_store, empty_query_result
+
+SINGLE_VALUED_FACETS = ("cid", "fid")
+MULTI_VALUED_FACETS = ("aid", "iid", "sid", "hid")
+
+def build_facet_where(filters: dict[str, list[str]]) -> Optional[dict]:
+    """
+    Where-clause for the /products-with-filter facet semantics: OR within a key, AND across keys.
+    Multi-valued facets are matched on the "<key>:<id>" flags written by build_index_metadata.
+    """
+    clauses = []
+    for key in SINGLE_VALUED_FACETS:
+        if filters.get(key):
+            clauses.append({key: {"$in": list(filters[key])}})
+    for key in MULTI_VALUED_FACETS:
+        options = [{f"{key}:{option_id}": {"$eq": True}} for option_id in filters.get(key) or []]
+        if len(options) == 1:
+            clauses.append(options[0])
+        elif options:
+            clauses.append({"$or": options})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
 class VectorSession:
-    product_collection: str = "functional_products"
+    """
+    Serves the current version of the product index and publishes new ones.
+
+    Layout under VECTOR_DB_PATH: versions/<version>/ holds one complete store each, `current` is a symlink
+    to the version being served and build.lock serializes builders. Readers only ever open the version
+    `current` points to and re-check it every VECTOR_INDEX_RELOAD_SECONDS, so a build publishes by
+    swapping the symlink atomically and no process ever writes to a store another one is reading.
+    """
+
+    changes_file = "changes.json"
+
+    def __init__(self, path: str = settings.VECTOR_DB_PATH, backend: str = settings.VECTOR_STORE_BACKEND):
+        self.path = path
+        self.backend = backend
+        self._store: Optional[VectorStore] = None
+        self._version_path: Optional[str] = None
+        # Store of the previous version, closed at the next swap: queries started before this one may still use it.
+        self._retired: Optional[VectorStore] = None
+        self._checked_at = -math.inf
+        self._open_lock = threading.Lock()
+        # Stores are synchronous; queries run on a bounded pool so they never block the event loop.
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.VECTOR_DB_MAX_WORKERS, thread_name_prefix="vector-db"
+        )
+
+    @property
+    def current_link(self) -> str:
+        return os.path.join(self.path, "current")
+
+    @property
+    def versions_path(self) -> str:
+        return os.path.join(self.path, "versions")
+
+    def current_version_path(self) -> Optional[str]:
+        if not os.path.islink(self.current_link):
+            return None
+        return os.path.realpath(self.current_link)
+
+    @staticmethod
+    def version_of(version_path: Optional[str]) -> Optional[str]:
+        return os.path.basename(version_path) if version_path else None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.version_of(self._version_path)
+
+    @property
+    def ready(self) -> bool:
+        """Whether a version is published, i.e. /chat can be answered; never opens a store."""
+        return self._store is not None or os.path.islink(self.current_link)
 
-    def __init__(self):
-        self.vector_session = chromadb.PersistentClient(path="./chroma_db")
+    @property
+    def store(self) -> Optional[VectorStore]:
+        """
+        Store of the current version, or None until a first version has been published. Opening a version
+        can take a while (NumpyVectorStore loads its records), so call this from the executor, never the
+        event loop; while one thread opens a new version, the others keep using the previous one.
+        """
+        if time.monotonic() - self._checked_at < settings.VECTOR_INDEX_RELOAD_SECONDS:
+            return self._store
+        # Only threads with nothing to serve yet wait for the thread that is opening a version.
+        if not self._open_lock.acquire(blocking=self._store is None):
+            return self._store
+        try:
+            now = time.monotonic()
+            if now - self._checked_at >= settings.VECTOR_INDEX_RELOAD_SECONDS:
+                self._checked_at = now
+                version_path = self.current_version_path()
+                if version_path != self._version_path:
+                    store = create_vector_store(self.backend, version_path) if version_path else None
+                    if self._retired is not None:
+                        self._retired.close()
+                    self._retired, self._store = self._store, store
+                    self._version_path = version_path
+                    if version_path:
+                        print(f"Vector index: serving version {self.version}")
+            return self._store
+        finally:
+            self._open_lock.release()
+
+    def try_acquire_build_lock(self, blocking: bool = False) -> Optional[IO]:
+        """The open lock file if this process now holds the exclusive build lock, else None."""
+        os.makedirs(self.path, exist_ok=True)
+        lock_file = open(os.path.join(self.path, "build.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def release_build_lock(self, lock_file: IO):
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    @contextmanager
+    def build_lock(self, blocking: bool = True):
+        """Yields whether this process holds the exclusive build lock."""
+        lock_file = self.try_acquire_build_lock(blocking)
+        if lock_file is None:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self.release_build_lock(lock_file)
+
+    def create_version(self) -> tuple[str, VectorStore]:
+        """A private copy of the current version for a builder to apply changes to; call with the build lock held."""
+        # Sortable by creation time, which _prune_versions relies on.
+        version = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        version_path = os.path.join(self.versions_path, version)
+        current = self.current_version_path()
+        if current:
+            shutil.copytree(current, version_path)
+        else:
+            os.makedirs(version_path)
+        return version_path, create_vector_store(self.backend, version_path)
+
+    def discard_version(self, version_path: str, store: VectorStore):
+        """Closes and deletes a version created by create_version that will not be published."""
+        store.close()
+        shutil.rmtree(version_path, ignore_errors=True)
+
+    def publish_version(self, version_path: str, changes: dict):
+        # Followers replay these ids to invalidate their caches (see core.catalog_sync).
+        with open(os.path.join(version_path, self.changes_file), "w", encoding="utf-8") as f:
+            json.dump({"parent": self.version_of(self.current_version_path()), **changes}, f)
+
+        tmp_link = os.path.join(self.path, f"current.{uuid.uuid4().hex}")
+        os.symlink(os.path.relpath(version_path, self.path), tmp_link)
+        os.replace(tmp_link, self.current_link)
+        self._checked_at = -math.inf
+        self._prune_versions()
+
+    def read_changes(self, version: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.versions_path, version, self.changes_file), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _prune_versions(self):
+        current = self.current_version_path()
+        versions = sorted(os.listdir(self.versions_path))
+        for version in versions[:-settings.VECTOR_INDEX_KEEP_VERSIONS]:
+            version_path = os.path.join(self.versions_path, version)
+            if version_path != current:
+                shutil.rmtree(version_path, ignore_errors=True)
 
     def clean_up(self):
-        self.vector_session.delete_collection(name=self.product_collection)
+        # Drops every persisted version; the next build re-embeds the whole catalog.
+        with self._open_lock:
+            for store in (self._retired, self._store):
+                if store is not None:
+                    store.close()
+            self._store = self._retired = None
+            self._version_path = None
+        shutil.rmtree(self.path, ignore_errors=False)
 
-        shutil.rmtree("./chroma_db", ignore_errors=False)
+    def _query_products(self, **kwargs):
+        store = self.store
+        if store is None:
+            return empty_query_result(len(kwargs["query_embeddings"]))
+        return store.query(**kwargs)
 
-    def get_product_collection(self):
-        return self.vector_session.get_or_create_collection(name=self.product_collection)
+    async def query_products(self, **kwargs):
+        loop = asyncio.get_running_loop()
+        with timed("vector_query"):
+            return await loop.run_in_executor(
+                self.executor, functools.partial(self._query_products, **kwargs)
+            )
 
-vector_session = VectorSession()
+    def _get_products(self, **kwargs):
+        store = self.store
+        if store is None:
+            return {"ids": [], "documents": [], "metadatas": []}
+        return store.get(**kwargs)
 
+    async def get_products(self, **kwargs):
+        loop = asyncio.get_running_loop()
+        with timed("vector_get"):
+            return await loop.run_in_executor(
+                self.executor, functools.partial(self._get_products, **kwargs)
+            )
+
+    def get_index_manifest(self) -> dict[str, dict]:
+        """Metadata of every product in the current version, keyed by product id."""
+        store = self.store
+        return store.manifest() if store else {}
+
+vector_session = VectorSession()
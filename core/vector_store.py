@@ -0,0 +1,449 @@
+import json
+import mmap
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Iterable, Optional, Sequence
+
+import chromadb
+import numpy as np
+from chromadb.api.shared_system_client import SharedSystemClient
+
+QUERY_INCLUDE = ("documents", "metadatas", "distances")
+GET_INCLUDE = ("documents", "metadatas")
+
+def empty_query_result(queries: int) -> dict:
+    return {
+        "ids": [[] for _ in range(queries)],
+        "documents": [[] for _ in range(queries)],
+        "metadatas": [[] for _ in range(queries)],
+        "distances": [[] for _ in range(queries)],
+    }
+
+def is_filter_key(key: str) -> bool:
+    """Keys core.vector_db.build_facet_where filters on: cid, fid and the "<facet>:<id>" flags."""
+    return key in ("cid", "fid") or ":" in key
+
+def merge_metadata(current: Optional[dict], update: dict) -> dict:
+    merged = {**(current or {}), **update}
+    return {key: value for key, value in merged.items() if value is not None}
+
+class VectorStore(ABC):
+    """
+    Storage backend of the product index.
+
+    Results use Chroma's shape ({"ids": ..., "documents": ..., ...}, one list per query embedding for
+    query()), so retrieval code does not depend on the backend. Metadata passed to upsert() and
+    update_metadata() is merged into the stored metadata; keys set to None are removed.
+    """
+
+    @abstractmethod
+    def manifest(self) -> dict[str, dict]:
+        """Metadata of every stored product, keyed by product id."""
+
+    @abstractmethod
+    def upsert(self, ids: list[str], embeddings: list, documents: list[str], metadatas: list[dict]):
+        pass
+
+    @abstractmethod
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        pass
+
+    @abstractmethod
+    def delete(self, ids: list[str]):
+        pass
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: list,
+        n_results: int,
+        where: Optional[dict] = None,
+        include: Sequence[str] = QUERY_INCLUDE,
+    ) -> dict:
+        pass
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[list[str]] = None,
+        where: Optional[dict] = None,
+        include: Sequence[str] = GET_INCLUDE,
+    ) -> dict:
+        pass
+
+    def commit(self):
+        """Makes pending writes visible to readers; a no-op for backends that write through."""
+
+    @abstractmethod
+    def reset(self):
+        pass
+
+    def close(self):
+        """Releases what the backend keeps open for the store's path; the store must not be used afterwards."""
+
+class ChromaVectorStore(VectorStore):
+    collection_name: str = "functional_products"
+
+    def __init__(self, path: str):
+        self.client = chromadb.PersistentClient(path=path)
+
+    @property
+    def collection(self):
+        # Cosine, so distances match NumpyVectorStore; collections created before keep Chroma's default L2.
+        return self.client.get_or_create_collection(
+            name=self.collection_name, metadata={"hnsw:space": "cosine"}
+        )
+
+    def close(self):
+        # Chroma caches one System (SQLite connections, HNSW segments, threads) per persist directory for
+        # the life of the process, and every index version is a new directory.
+        system = SharedSystemClient._identifier_to_system.pop(self.client._identifier, None)
+        if system is not None:
+            system.stop()
+
+    def manifest(self) -> dict[str, dict]:
+        result = self.collection.get(include=["metadatas"])
+        return {
+            product_id: metadata or {}
+            for product_id, metadata in zip(result["ids"], result["metadatas"])
+        }
+
+    @staticmethod
+    def _shrinking(collection, ids: list[str], metadatas: list[dict], include: list[str]) -> dict:
+        """
+        Stored records (with `include`) whose update removes keys, keyed by id, with their complete new
+        metadata. Chroma merges metadata on write and rejects None values, so removing a key means
+        deleting the record and adding it again.
+        """
+        updates = {product_id: metadata for product_id, metadata in zip(ids, metadatas) if None in metadata.values()}
+        if not updates:
+            return {}
+        stored = collection.get(ids=list(updates), include=["metadatas", *include])
+        return {
+            product_id: {
+                "metadata": merge_metadata(stored["metadatas"][position], updates[product_id]),
+                **{key: stored[key][position] for key in include},
+            }
+            for position, product_id in enumerate(stored["ids"])
+        }
+
+    def upsert(self, ids: list[str], embeddings: list, documents: list[str], metadatas: list[dict]):
+        collection = self.collection
+        replaced = self._shrinking(collection, ids, metadatas, include=[])
+        if replaced:
+            collection.delete(ids=list(replaced))
+        collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=[
+                replaced[product_id]["metadata"] if product_id in replaced else merge_metadata(None, metadata)
+                for product_id, metadata in zip(ids, metadatas)
+            ],
+        )
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        collection = self.collection
+        replaced = self._shrinking(collection, ids, metadatas, include=["embeddings", "documents"])
+        if replaced:
+            collection.delete(ids=list(replaced))
+            collection.add(
+                ids=list(replaced),
+                embeddings=[record["embeddings"] for record in replaced.values()],
+                documents=[record["documents"] for record in replaced.values()],
+                metadatas=[record["metadata"] for record in replaced.values()],
+            )
+        updates = [(product_id, metadata) for product_id, metadata in zip(ids, metadatas) if product_id not in replaced]
+        if updates:
+            collection.update(
+                ids=[product_id for product_id, _ in updates],
+                metadatas=[merge_metadata(None, metadata) for _, metadata in updates],
+            )
+
+    def delete(self, ids: list[str]):
+        self.collection.delete(ids=ids)
+
+    def query(self, query_embeddings, n_results, where=None, include=QUERY_INCLUDE) -> dict:
+        return self.collection.query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where, include=list(include)
+        )
+
+    def get(self, ids=None, where=None, include=GET_INCLUDE) -> dict:
+        return self.collection.get(ids=ids, where=where, include=list(include))
+
+    def reset(self):
+        self.client.delete_collection(name=self.collection_name)
+
+def normalize_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+class RecordFile:
+    """
+    Documents and metadata of a NumpyVectorStore, one JSON [document, metadata] line per record in a
+    memory-mapped file; only the line offsets are kept in the heap.
+    """
+
+    def __init__(self, path: Optional[str], offsets: Sequence[int]):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._data = b""
+        if path is not None and os.path.getsize(path):
+            with open(path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position: int) -> tuple[str, dict]:
+        document, metadata = json.loads(self._data[self.offsets[position]:self.offsets[position + 1]])
+        return document, metadata
+
+    def metadata(self, position: int) -> dict:
+        return self[position][1]
+
+    @staticmethod
+    def write(path: str, records: Iterable[tuple[str, dict]]) -> list[int]:
+        """Writes `records` to `path`; returns the offsets to open it with."""
+        offsets = [0]
+        with open(path, "wb") as f:
+            for document, metadata in records:
+                offsets.append(offsets[-1] + f.write(json.dumps([document, metadata]).encode("utf-8") + b"\n"))
+        return offsets
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact top-k over L2-normalized float32 embeddings kept in a memory-mapped .npy file.
+
+    Workers map the file read-only, so the embedding matrix lives once in the page cache however
+    many processes serve queries; documents and metadata (hashes, the chat summary) are mapped the
+    same way from a RecordFile and decoded only for the records a call returns. A query is one matrix
+    product plus argpartition; facet filters are answered from an inverted (key, value) -> positions
+    index over the facet keys only, written at commit. Writes are buffered in memory and published by
+    commit(): new embeddings and record files are written, then records.json, which names them, is
+    atomically replaced, so readers never see a torn index.
+    """
+
+    records_file = "records.json"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._pending: Optional[dict] = None
+        self.load()
+
+    def load(self):
+        records_path = os.path.join(self.path, self.records_file)
+        if os.path.exists(records_path):
+            with open(records_path, encoding="utf-8") as f:
+                records = json.load(f)
+            embeddings = np.load(os.path.join(self.path, records["embeddings_file"]), mmap_mode="r")
+            stored = RecordFile(os.path.join(self.path, records["data_file"]), records["offsets"])
+        else:
+            records = {"ids": [], "filters": []}
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+            stored = RecordFile(None, [0])
+
+        # Readers hold a reference to the previous snapshot until they finish, so swap in one assignment.
+        self._snapshot = (
+            records["ids"],
+            stored,
+            embeddings,
+            {product_id: position for position, product_id in enumerate(records["ids"])},
+            {(key, value): np.asarray(positions, dtype=np.int64) for key, value, positions in records["filters"]},
+        )
+
+    def manifest(self) -> dict[str, dict]:
+        ids, stored, _, _, _ = self._snapshot
+        return {product_id: stored.metadata(position) for position, product_id in enumerate(ids)}
+
+    def _begin_write(self) -> dict:
+        if self._pending is None:
+            ids, stored, embeddings, _, _ = self._snapshot
+            records = [stored[position] for position in range(len(ids))]
+            self._pending = {
+                "ids": list(ids),
+                "documents": [document for document, _ in records],
+                "metadatas": [metadata for _, metadata in records],
+                "vectors": list(np.array(embeddings)),
+                "positions": {product_id: position for position, product_id in enumerate(ids)},
+            }
+        return self._pending
+
+    def upsert(self, ids: list[str], embeddings: list, documents: list[str], metadatas: list[dict]):
+        vectors = normalize_rows(embeddings)
+        with self._write_lock:
+            pending = self._begin_write()
+            for product_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                position = pending["positions"].get(product_id)
+                if position is None:
+                    pending["positions"][product_id] = len(pending["ids"])
+                    pending["ids"].append(product_id)
+                    pending["documents"].append(document)
+                    pending["metadatas"].append(merge_metadata(None, metadata))
+                    pending["vectors"].append(vector)
+                else:
+                    pending["documents"][position] = document
+                    pending["metadatas"][position] = merge_metadata(pending["metadatas"][position], metadata)
+                    pending["vectors"][position] = vector
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict]):
+        with self._write_lock:
+            pending = self._begin_write()
+            for product_id, metadata in zip(ids, metadatas):
+                position = pending["positions"].get(product_id)
+                if position is not None:
+                    pending["metadatas"][position] = merge_metadata(pending["metadatas"][position], metadata)
+
+    def delete(self, ids: list[str]):
+        with self._write_lock:
+            pending = self._begin_write()
+            for product_id in ids:
+                position = pending["positions"].pop(product_id, None)
+                if position is not None:
+                    # Tombstone; compacted on commit so positions of other records stay valid until then.
+                    pending["ids"][position] = None
+
+    def commit(self):
+        with self._write_lock:
+            pending, self._pending = self._pending, None
+            if pending is None:
+                return
+
+            keep = [position for position, product_id in enumerate(pending["ids"]) if product_id is not None]
+            vectors = [pending["vectors"][position] for position in keep]
+            embeddings = np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+            os.makedirs(self.path, exist_ok=True)
+            embeddings_file = f"embeddings-{uuid.uuid4().hex}.npy"
+            with open(os.path.join(self.path, embeddings_file), "wb") as f:
+                np.save(f, embeddings.astype(np.float32, copy=False))
+            data_file = f"records-{uuid.uuid4().hex}.jsonl"
+            offsets = RecordFile.write(
+                os.path.join(self.path, data_file),
+                ((pending["documents"][position], pending["metadatas"][position]) for position in keep),
+            )
+
+            filters = defaultdict(list)
+            for new_position, position in enumerate(keep):
+                for key, value in pending["metadatas"][position].items():
+                    if is_filter_key(key):
+                        filters[(key, value)].append(new_position)
+
+            records_path = os.path.join(self.path, self.records_file)
+            previous = {}
+            if os.path.exists(records_path):
+                with open(records_path, encoding="utf-8") as f:
+                    previous = json.load(f)
+
+            tmp_path = f"{records_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "embeddings_file": embeddings_file,
+                    "data_file": data_file,
+                    "ids": [pending["ids"][position] for position in keep],
+                    "offsets": offsets,
+                    "filters": [[key, value, positions] for (key, value), positions in filters.items()],
+                }, f)
+            os.replace(tmp_path, records_path)
+
+            # Processes still mapping the old files keep their pages until they reload.
+            for previous_file in (previous.get("embeddings_file"), previous.get("data_file")):
+                if previous_file:
+                    os.remove(os.path.join(self.path, previous_file))
+            self.load()
+
+    def _mask(self, where: dict, stored: RecordFile, metadata_index: dict) -> np.ndarray:
+        size = len(stored)
+        if "$and" in where:
+            mask = np.ones(size, dtype=bool)
+            for clause in where["$and"]:
+                mask &= self._mask(clause, stored, metadata_index)
+            return mask
+        if "$or" in where:
+            mask = np.zeros(size, dtype=bool)
+            for clause in where["$or"]:
+                mask |= self._mask(clause, stored, metadata_index)
+            return mask
+
+        (key, condition), = where.items()
+        operator, value = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+        if operator not in ("$eq", "$in"):
+            raise ValueError(f"Unsupported where operator: {operator}")
+
+        options = value if operator == "$in" else [value]
+        if not is_filter_key(key):
+            # Not indexed; every record is decoded instead.
+            return np.fromiter(
+                (stored.metadata(position).get(key) in options for position in range(size)), dtype=bool, count=size
+            )
+
+        mask = np.zeros(size, dtype=bool)
+        for option in options:
+            positions = metadata_index.get((key, option))
+            if positions is not None:
+                mask[positions] = True
+        return mask
+
+    def query(self, query_embeddings, n_results, where=None, include=QUERY_INCLUDE) -> dict:
+        ids, stored, embeddings, _, metadata_index = self._snapshot
+        queries = normalize_rows(query_embeddings)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        candidates = None
+        if where:
+            candidates = np.flatnonzero(self._mask(where, stored, metadata_index))
+        matrix = embeddings if candidates is None else embeddings[candidates]
+
+        scores = queries @ matrix.T if len(matrix) else np.zeros((len(queries), 0), dtype=np.float32)
+        k = min(n_results, scores.shape[1])
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+            top = top[np.argsort(-row[top])]
+            positions = top if candidates is None else candidates[top]
+            records = [stored[position] for position in positions]
+            results["ids"].append([ids[position] for position in positions])
+            results["documents"].append([document for document, _ in records])
+            results["metadatas"].append([metadata for _, metadata in records])
+            results["distances"].append((1.0 - row[top]).tolist())
+
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                results[key] = None
+        return results
+
+    def get(self, ids=None, where=None, include=GET_INCLUDE) -> dict:
+        stored_ids, stored, _, positions_by_id, metadata_index = self._snapshot
+        if ids is None:
+            positions = range(len(stored_ids))
+        else:
+            positions = [positions_by_id[product_id] for product_id in ids if product_id in positions_by_id]
+        if where:
+            mask = self._mask(where, stored, metadata_index)
+            positions = [position for position in positions if mask[position]]
+
+        records = [stored[position] for position in positions] if set(include) & set(GET_INCLUDE) else []
+        return {
+            "ids": [stored_ids[position] for position in positions],
+            "documents": [document for document, _ in records] if "documents" in include else None,
+            "metadatas": [metadata for _, metadata in records] if "metadatas" in include else None,
+        }
+
+    def reset(self):
+        with self._write_lock:
+            self._pending = None
+            for name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+                if name == self.records_file or name.startswith(("embeddings-", "records-")):
+                    os.remove(os.path.join(self.path, name))
+            self.load()
+
+def create_vector_store(backend: str, path: str) -> VectorStore:
+    if backend == "numpy":
+        return NumpyVectorStore(path)
+    return ChromaVectorStore(path)